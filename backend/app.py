@@ -1,13 +1,27 @@
 import os
+import json
+import math
+import time
+import threading
 import joblib
 import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta, timezone
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from supabase import create_client, Client
 from dotenv import load_dotenv
 from flask_cors import CORS
 from improved_model import EnhancedDelayPredictor
+from compiled_model import CompiledDelayPredictor, compiled_model_exists
+from fleet_engine import FleetEngine
+from station_index import StationIndex
+from kpis import KpiAggregator
+from schedule_loader import ScheduleLoader
+from prediction_cache import PredictionCache
+from online_updates import OnlineUpdater
+from metrics import registry as metrics_registry, timed, SamplingProfiler, REQUEST_METRIC
+from what_if import compare_candidates  # Forks its worker pool on import, so keep it ahead of any thread start.
+from sim_clock import SimulationClock
+from cascade import CascadePropagator, DEFAULT_SEED, MIN_HEADWAY_MINUTES, REPORT_THRESHOLD_MINUTES
 
 # --- 1. SETUP & CONFIGURATION ---
 load_dotenv()
@@ -21,16 +35,46 @@ CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})
 
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
+# No credentials is fine when schedules come from SCHEDULES_PARQUET (offline runs).
+supabase: Client = create_client(url, key) if url else None
+
+# 'object' steps each Train in Python; 'vectorized' advances the whole fleet through FleetEngine.
+SIM_ENGINE = os.environ.get("SIM_ENGINE", "object")
+
+# Parsed schedules are loaded once and shared by every TrainSimulator built afterwards (resets, scenarios).
+schedule_loader = ScheduleLoader(supabase)
+
+# Prediction cache: LRU size, entry lifetime, and the step network congestion is rounded to.
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 1024))
+PREDICTION_CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", 30))
+CONGESTION_QUANTUM = float(os.environ.get("CONGESTION_QUANTUM", 0.05))
+
+# Background clock: simulated minutes per tick and real seconds between ticks (0 = only advance manually).
+SIM_STEP_MINUTES = int(os.environ.get("SIM_STEP_MINUTES", 5))
+SIM_TICK_SECONDS = float(os.environ.get("SIM_TICK_SECONDS", 10))
+MODEL_PATH = 'enhanced_delay_model.pkl'
+
+# Online model updates: records per batch, longest wait before a partial batch is applied (0 = wait for a full batch).
+ONLINE_UPDATE_ROWS = int(os.environ.get("ONLINE_UPDATE_ROWS", 256))
+ONLINE_UPDATE_SECONDS = float(os.environ.get("ONLINE_UPDATE_SECONDS", 60))
+
+# Opt-in sampling profiler: milliseconds between stack samples (0 = off). Read the result at GET /profile.
+PROFILER_INTERVAL_MS = float(os.environ.get("PROFILER_INTERVAL_MS", 0))
 
 # --- 2. CORE SIMULATION LOGIC ---
-class Train: # No changes here
+class Train:
     def __init__(self, train_id, schedule_data):
         self.id = train_id
         self.schedule = sorted([(s['station_name'], datetime.fromisoformat(s['scheduled_time'])) for s in schedule_data], key=lambda x: x[1])
         self.current_station_index = 0
         self.current_delay = 0
         self.status = 'ON_TIME'
+    @classmethod
+    def from_schedule(cls, train_id, schedule):
+        """Builds a train from an already parsed, time-ordered [(station_name, datetime)] list."""
+        train = cls(train_id, [])
+        train.schedule = schedule
+        return train
     def get_current_location(self):
         return self.schedule[self.current_station_index][0]
     def update(self, current_time):
@@ -41,27 +85,84 @@ class Train: # No changes here
             if self.current_station_index < len(self.schedule) - 1: self.current_station_index += 1
             else: self.status = 'FINISHED'
 
-class TrainSimulator: # No changes here
-    def __init__(self):
+class TrainSimulator:
+    def __init__(self, engine=None):
         self.trains = {}
         self.current_time = datetime(2023, 10, 27, 8, 0, 0, tzinfo=timezone.utc)
+        self.engine = engine or SIM_ENGINE
+        self.fleet = None
+        self.station_index = None
+        self.kpis = None
+        self.changed = set()  # Ids of trains whose index, delay or status changed since the last drain_changes().
         self._load_initial_state()
     def _load_initial_state(self):
-        print("Loading initial train schedules from Supabase...")
-        response = supabase.table('schedules').select('train_id, station_name, scheduled_time').execute()
-        all_schedules = response.data
-        train_ids = set(s['train_id'] for s in all_schedules)
-        self.trains = {train_id: Train(train_id, [s for s in all_schedules if s['train_id'] == train_id]) for train_id in train_ids}
-        print(f"Successfully loaded {len(self.trains)} trains.")
+        with timed('load_initial_state'):
+            schedules = schedule_loader.load()
+            self.trains = {train_id: Train.from_schedule(train_id, schedule) for train_id, schedule in schedules.items()}
+            self.station_index = StationIndex(self.trains)
+            if self.engine == 'vectorized': self.fleet = FleetEngine(self.trains, self.current_time)
+            self.kpis = KpiAggregator(self.trains)
+            self.kpis.record(self.current_time)
+            print(f"Successfully loaded {len(self.trains)} trains.")
     def step(self, minutes=1):
-        self.current_time += timedelta(minutes=minutes)
-        for train in self.trains.values(): train.update(self.current_time)
+        with timed('simulator_step'):
+            self.current_time += timedelta(minutes=minutes)
+            if self.fleet is not None:
+                for train, previous_status in self.fleet.sync_trains(self.trains, self.fleet.step(minutes)):
+                    self.station_index.advance(train)
+                    self.changed.add(train.id)
+                    if train.status != previous_status:
+                        self.kpis.update(train, previous_status, train.current_delay)
+                        if train.status == 'FINISHED': self.station_index.remove(train)
+            else:
+                for train in self.trains.values():
+                    previous_index, previous_status = train.current_station_index, train.status
+                    train.update(self.current_time)
+                    if train.current_station_index != previous_index:
+                        self.station_index.advance(train)
+                        self.changed.add(train.id)
+                    if train.status != previous_status:
+                        self.kpis.update(train, previous_status, train.current_delay)
+                        self.changed.add(train.id)
+                        if train.status == 'FINISHED': self.station_index.remove(train)
+            self.kpis.record(self.current_time)
     def add_delay_event(self, train_id, delay_minutes, cause="MANUAL"):
         if train_id in self.trains:
-            self.trains[train_id].current_delay += delay_minutes
-            self.trains[train_id].status = 'DELAYED'
+            train = self.trains[train_id]
+            previous_status, previous_delay = train.status, train.current_delay
+            train.current_delay += delay_minutes
+            train.status = 'DELAYED'
+            self.kpis.update(train, previous_status, previous_delay)
+            self.changed.add(train_id)
+            if self.fleet is not None: self.fleet.add_delay(train_id, delay_minutes)
             return True
         return False
+    def drain_changes(self):
+        """Returns and clears the ids of trains changed since the previous call."""
+        changed, self.changed = self.changed, set()
+        return changed
+    def snapshot(self):
+        """Captures the mutable simulation state. Schedules are shared by reference, never copied."""
+        return {
+            'current_time': self.current_time,
+            'trains': {tid: (t.schedule, t.current_station_index, t.current_delay, t.status) for tid, t in self.trains.items()},
+            'station_index': self.station_index.fork(),
+            'kpis': self.kpis.fork(),
+            'fleet': self.fleet.fork() if self.fleet is not None else None
+        }
+    def restore(self, snapshot):
+        """Returns to a snapshot without touching the database; the snapshot stays reusable."""
+        trains = {}
+        for train_id, (schedule, index, delay, status) in snapshot['trains'].items():
+            train = trains[train_id] = Train.from_schedule(train_id, schedule)
+            train.current_station_index, train.current_delay, train.status = index, delay, status
+        self.trains = trains
+        self.current_time = snapshot['current_time']
+        self.station_index = snapshot['station_index'].fork()
+        self.kpis = snapshot['kpis'].fork()
+        self.fleet = snapshot['fleet'].fork() if snapshot['fleet'] is not None else None
+        self.engine = 'vectorized' if self.fleet is not None else 'object'
+        self.changed = set(self.trains)
     def get_state(self):
         """Creates a JSON-friendly snapshot of the current simulation state."""
         return {
@@ -78,31 +179,115 @@ class TrainSimulator: # No changes here
 # --- 3. GLOBAL INSTANCES & ENHANCED MODEL LOADING ---
 print("Initializing Train Simulator...")
 simulator = TrainSimulator()
+base_snapshot = simulator.snapshot()
+
+# Demo scenarios are stored as delay events applied on top of base_snapshot.
+SCENARIOS = {
+    'single_breakdown': {
+        'message': 'Scenario: A critical Express Train has broken down, causing immediate congestion.',
+        'events': [("T-105", 25, "Engine Failure on Express Train"), ("T-108", 5, "Congestion from T-105")]
+    },
+    'weather_disruption': {
+        'message': 'Scenario: A sudden weather crisis is causing widespread network disruption.',
+        'events': [("T-102", 15, "Low visibility (Fog)"), ("T-110", 20, "Low visibility (Fog)"), ("T-115", 10, "Low visibility (Fog)"), ("T-104", 12, "Low visibility (Fog)")]
+    }
+}
 
-print("Loading ENHANCED delay prediction model...")
-try:
-    enhanced_predictor = joblib.load('enhanced_delay_model.pkl')
-    if not enhanced_predictor.is_trained:
-         raise Exception("Loaded model is not trained!")
-    print("✅ Enhanced model loaded successfully.")
-except FileNotFoundError:
-    print("❌ FATAL: enhanced_delay_model.pkl not found. Please run train_enhanced_model.py first.")
-    enhanced_predictor = None
+def serialize_train(train):
+    return {
+        'id': train.id,
+        'current_station': train.get_current_location(),
+        'next_station': train.schedule[train.current_station_index + 1][0] if train.current_station_index + 1 < len(train.schedule) else 'End of Line',
+        'status': 'Delayed' if train.current_delay > 0 else 'On-Time',
+        'delay_minutes': train.current_delay
+    }
+
+def serialize_simulation_state(sim):
+    """The /simulation_state payload as JSON bytes, built once per tick by the simulation clock."""
+    state = {
+        'currentTime': sim.current_time.strftime('%Y-%m-%d %H:%M'),
+        'trains': [serialize_train(train) for train in sim.trains.values() if train.status != 'FINISHED']
+    }
+    return json.dumps(state).encode()
+
+def serialize_simulation_delta(sim, changed_ids):
+    """Only the trains that changed this tick: updated rows plus the ids of trains that finished."""
+    changed = [sim.trains[train_id] for train_id in changed_ids if train_id in sim.trains]
+    delta = {
+        'currentTime': sim.current_time.strftime('%Y-%m-%d %H:%M'),
+        'updated': [serialize_train(train) for train in changed if train.status != 'FINISHED'],
+        'finished': [train.id for train in changed if train.status == 'FINISHED']
+    }
+    return json.dumps(delta).encode()
+
+sim_clock = SimulationClock(lambda: simulator, serialize_simulation_state, serialize_simulation_delta, step_minutes=SIM_STEP_MINUTES, tick_seconds=SIM_TICK_SECONDS)
+sim_clock.start()
+
+def load_enhanced_model():
+    print("Loading ENHANCED delay prediction model...")
+    try:
+        # Prefer the compiled artifact from train_enhanced_model.py: no sklearn import, faster predictions.
+        predictor = CompiledDelayPredictor() if compiled_model_exists() else joblib.load(MODEL_PATH)
+        if not predictor.is_trained:
+             raise Exception("Loaded model is not trained!")
+        predictor.warm_up()
+        print(f"✅ Enhanced model loaded successfully ({type(predictor).__name__}).")
+        return predictor
+    except FileNotFoundError:
+        print(f"❌ FATAL: {MODEL_PATH} not found. Please run train_enhanced_model.py first.")
+        return None
+
+enhanced_predictor = load_enhanced_model()
+prediction_cache = PredictionCache(enhanced_predictor, max_size=PREDICTION_CACHE_SIZE, ttl_seconds=PREDICTION_CACHE_TTL, congestion_step=CONGESTION_QUANTUM)
+model_lock = threading.Lock()
+
+def swap_predictor(predictor, expected=None):
+    """Install a new serving model; requests already running finish on the old one.
+
+    With `expected`, the swap only happens if that model is still the one serving.
+    """
+    global enhanced_predictor
+    with model_lock:
+        if expected is not None and enhanced_predictor is not expected: return False
+        enhanced_predictor = predictor
+        prediction_cache.reset(predictor)
+    return True
+
+online_updater = OnlineUpdater(lambda: enhanced_predictor, lambda old, new: swap_predictor(new, expected=old),
+                               batch_rows=ONLINE_UPDATE_ROWS, flush_seconds=ONLINE_UPDATE_SECONDS or None)
+online_updater.start()
 
 # --- 4. ANALYSIS & RECOMMENDATION HELPERS ---
-def calculate_cascade_impact(primary_train_id, primary_delay_minutes): # No changes here
-    affected_trains = []
+def calculate_cascade_impact(primary_train_id, primary_delay_minutes, seed=DEFAULT_SEED, headway_minutes=MIN_HEADWAY_MINUTES):
     primary_train = simulator.trains.get(primary_train_id)
     if not primary_train: return {'error': 'Train not found'}
-    primary_future_stations = {s[0] for s in primary_train.schedule[primary_train.current_station_index:]}
-    for other_train in simulator.trains.values():
-        if other_train.id == primary_train_id: continue
-        other_future_stations = {s[0] for s in other_train.schedule[other_train.current_station_index:]}
-        if primary_future_stations.intersection(other_future_stations):
-            additional_delay = int(primary_delay_minutes * np.random.uniform(0.3, 0.7))
-            if additional_delay > 5: affected_trains.append({'id': other_train.id, 'additional_delay': additional_delay})
+    # The clock's tick mutates the station index the propagator walks, so hold it off meanwhile.
+    with sim_clock.lock, timed('cascade_analysis'):
+        propagator = CascadePropagator(simulator.trains, simulator.station_index, simulator.current_time, headway_minutes=headway_minutes, seed=seed)
+        knock_on = propagator.propagate(primary_train_id, primary_delay_minutes or 0)
+    affected_trains = [
+        {'id': train_id, 'additional_delay': int(round(k['additional_delay'])), 'station': k['station'], 'caused_by': k['caused_by'], 'hops': k['hops']}
+        for train_id, k in sorted(knock_on.items(), key=lambda item: -item[1]['additional_delay'])
+        if k['additional_delay'] > REPORT_THRESHOLD_MINUTES
+    ]
     return {'primary_train_id': primary_train_id, 'affected_count': len(affected_trains), 'total_impact_minutes': sum(t['additional_delay'] for t in affected_trains), 'affected_trains': affected_trains}
 
+def network_congestion():
+    """Share of the fleet currently running delayed."""
+    with timed('congestion_scan'):
+        return len([t for t in simulator.trains.values() if t.status == 'DELAYED']) / len(simulator.trains) if simulator.trains else 0
+
+def is_number(value):
+    """True for a finite JSON number (booleans are not numbers here)."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def read_number(data, name, default, integer=False, positive=False):
+    """Returns (value, error) for an optional numeric body field; error is None when it is valid."""
+    value = data.get(name, default)
+    if not is_number(value) or (integer and not isinstance(value, int)) or (value <= 0 if positive else value < 0):
+        return value, f"'{name}' must be a {'positive' if positive else 'non-negative'} {'integer' if integer else 'number'}"
+    return value, None
+
 def generate_recommendations(cascade_analysis, risk_level="LOW"): # ENHANCED
     recommendations = []
     if risk_level == 'HIGH':
@@ -115,51 +300,79 @@ def generate_recommendations(cascade_analysis, risk_level="LOW"): # ENHANCED
         recommendations.append({'id': 'REC-MONITOR', 'priority': 'Low', 'action': "Monitor network. Predicted impact is within acceptable parameters.", 'confidence': 0.95})
     return recommendations
 
+profiler = SamplingProfiler(PROFILER_INTERVAL_MS / 1000) if PROFILER_INTERVAL_MS > 0 else None
+if profiler: profiler.start()
+
 # --- 5. API ENDPOINTS ---
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics_registry.observe(REQUEST_METRIC, {'endpoint': endpoint, 'method': request.method, 'status': str(response.status_code)}, time.perf_counter() - started)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Stage and request latency histograms in the Prometheus text format."""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/profile', methods=['GET'])
+def get_profile():
+    """Collapsed stacks from the sampling profiler (flamegraph.pl / speedscope input). ?reset=1 starts over."""
+    if not profiler: return jsonify({'error': 'Profiler is off. Set PROFILER_INTERVAL_MS to enable it.'}), 404
+    body = profiler.collapsed(request.args.get('limit', type=int))
+    if request.args.get('reset'): profiler.reset()
+    return Response(body, mimetype='text/plain')
+
 @app.route('/simulation_state', methods=['GET'])
 def get_simulation_state():
-    simulator.step(minutes=5)
-    # Convert your custom Train objects into a standard dictionary format
-    train_list = []
-    for train in simulator.trains.values():
-        if train.status != 'FINISHED':
-            train_list.append({
-                'id': train.id,
-                'current_station': train.get_current_location(),
-                'next_station': train.schedule[train.current_station_index + 1][0] if train.current_station_index + 1 < len(train.schedule) else 'End of Line',
-                'status': 'Delayed' if train.current_delay > 0 else 'On-Time',
-                'delay_minutes': train.current_delay
-            })
-    
-    state = {
-        'currentTime': simulator.current_time.strftime('%Y-%m-%d %H:%M'),
-        'trains': train_list
-    }
-    return jsonify(state)
+    # The background clock advances the simulation; this only hands out its latest published state.
+    etag, body = sim_clock.latest
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+@app.route('/simulation_stream', methods=['GET'])
+def stream_simulation_state():
+    """Server-Sent Events: one 'snapshot' event on connect, then a 'delta' event per tick."""
+    response = Response(sim_clock.stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/kpis', methods=['GET'])
 def get_kpis():
-    trains = [t for t in simulator.trains.values() if t.status != 'FINISHED']
-    total_trains = len(trains)
-    if total_trains == 0:
-        kpis = [
-            {'id': 'on_time_percentage', 'title': 'On-Time Percentage', 'value': '100%', 'change': 'N/A'},
-            {'id': 'average_delay', 'title': 'Average Delay', 'value': '0 min', 'change': 'N/A'},
-            {'id': 'active_trains', 'title': 'Active Trains', 'value': '0', 'change': 'N/A'}
-        ]
-        return jsonify({'kpis': kpis})
+    # Running totals are maintained by the simulator, so this never scans the fleet.
+    aggregates = simulator.kpis
+    last_hour = aggregates.snapshot_before(simulator.current_time - timedelta(hours=1))
+    total_trains = aggregates.active
+    on_time_percentage = round((aggregates.on_time / total_trains) * 100, 1) if total_trains else 100.0
+    average_delay_minutes = round(aggregates.delay_sum / total_trains, 1) if total_trains else 0.0
 
-    on_time_count = sum(1 for t in trains if t.status == 'ON_TIME')
-    total_delay = sum(t.current_delay for t in trains)
-    on_time_percentage = round((on_time_count / total_trains) * 100, 1)
-    average_delay_minutes = round(total_delay / total_trains, 1)
+    if last_hour:
+        _, past_active, past_on_time, past_delay_sum, _, _ = last_hour
+        past_on_time_percentage = round((past_on_time / past_active) * 100, 1) if past_active else 100.0
+        past_average_delay = round(past_delay_sum / past_active, 1) if past_active else 0.0
+        on_time_change = f'{on_time_percentage - past_on_time_percentage:+.1f}% from last hour'
+        delay_change = f'{average_delay_minutes - past_average_delay:+.1f} min from last hour'
+        active_change = f'{total_trains - past_active:+d} from last hour'
+    else:
+        on_time_change = delay_change = active_change = 'N/A'
 
     kpis = [
-        {'id': 'on_time_percentage', 'title': 'On-Time Percentage', 'value': f'{on_time_percentage}%', 'change': '+0.5% from last hour'},
-        {'id': 'average_delay', 'title': 'Average Delay', 'value': f'{average_delay_minutes} min', 'change': '-2% from last hour'},
-        {'id': 'active_trains', 'title': 'Active Trains', 'value': str(total_trains), 'change': '+1 from last hour'}
+        {'id': 'on_time_percentage', 'title': 'On-Time Percentage', 'value': f'{on_time_percentage}%', 'change': on_time_change},
+        {'id': 'average_delay', 'title': 'Average Delay', 'value': f'{average_delay_minutes} min', 'change': delay_change},
+        {'id': 'active_trains', 'title': 'Active Trains', 'value': str(total_trains), 'change': active_change}
     ]
-    return jsonify({'kpis': kpis})
+    return jsonify({'kpis': kpis, 'delay_percentiles': {'p50': aggregates.percentile(0.5), 'p95': aggregates.percentile(0.95)}})
 
 @app.route('/predict_delay', methods=['POST']) # COMPLETELY REPLACED
 def predict_delay_enhanced():
@@ -175,17 +388,81 @@ def predict_delay_enhanced():
         'priority': 1 if 'Express' in train.id else 2,
         'initial_delay': train.current_delay,
         'weather_severity': 8 if data.get('scenario') == 'weather_disruption' else 1,
-        'congestion': len([t for t in simulator.trains.values() if t.status == 'DELAYED']) / len(simulator.trains)
+        'congestion': network_congestion()
     }
-    prediction_result = enhanced_predictor.predict_with_explanation(input_features)
+    prediction_result = prediction_cache.predict_with_explanation(input_features)
     # Manually add train_id to the response as required by the frontend
     prediction_result['train_id'] = train_id
     return jsonify(prediction_result)
 
+@app.route('/predict_delay_batch', methods=['POST'])
+def predict_delay_batch():
+    """Scores every active train (or the listed 'train_ids') with one ensemble pass."""
+    if not enhanced_predictor: return jsonify({'error': 'Model not loaded'}), 500
+    data = request.get_json(silent=True) or {}
+    requested_ids = data.get('train_ids')
+    if requested_ids is not None and not (isinstance(requested_ids, list) and all(isinstance(tid, str) for tid in requested_ids)):
+        return jsonify({'error': "'train_ids' must be a list of strings"}), 400
+    if requested_ids is None:
+        trains = [t for t in simulator.trains.values() if t.status != 'FINISHED']
+        not_found = []
+    else:
+        trains = [simulator.trains[tid] for tid in requested_ids if tid in simulator.trains]
+        not_found = [tid for tid in requested_ids if tid not in simulator.trains]
+
+    input_features = pd.DataFrame({
+        'hour': simulator.current_time.hour,
+        'day_of_week': simulator.current_time.weekday(),
+        'priority': [1 if 'Express' in t.id else 2 for t in trains],
+        'initial_delay': [t.current_delay for t in trains],
+        'weather_severity': 8 if data.get('scenario') == 'weather_disruption' else 1,
+        'congestion': network_congestion()
+    })
+    results = prediction_cache.predict_batch(input_features)
+    for train, result in zip(trains, results): result['train_id'] = train.id
+    return jsonify({'predictions': results, 'not_found': not_found})
+
+@app.route('/prediction_cache', methods=['GET'])
+def get_prediction_cache_stats():
+    return jsonify(prediction_cache.stats())
+
+@app.route('/reload_model', methods=['POST'])
+def reload_model():
+    """Re-reads the model file and clears cached predictions made by the old model."""
+    predictor = load_enhanced_model()
+    if not predictor: return jsonify({'error': 'Model not loaded'}), 500
+    swap_predictor(predictor)
+    return jsonify({'message': 'Model reloaded.'})
+
+@app.route('/delay_events', methods=['POST'])
+def ingest_delay_events():
+    """Queues observed delays for the online model update.
+
+    Body: {"records": [{"features": {...basic features...}, "delay_minutes": n}], "apply": false}
+    """
+    data = request.get_json(silent=True) or {}
+    records = data.get('records')
+    if not isinstance(records, list) or not all('delay_minutes' in r for r in records):
+        return jsonify({'error': "'records' must be a list of {'features', 'delay_minutes'}"}), 400
+    for record in records: online_updater.submit(record.get('features', {}), record['delay_minutes'])
+    applied = online_updater.flush() if data.get('apply') else 0
+    return jsonify({'queued': len(records), 'applied': applied, **online_updater.stats()})
+
+@app.route('/online_updates', methods=['GET'])
+def get_online_update_stats():
+    return jsonify(online_updater.stats())
+
 @app.route('/analyze_impact', methods=['POST'])
 def analyze_impact():
-    data = request.get_json()
-    impact_data = calculate_cascade_impact(data.get('train_id'), data.get('predicted_delay'))
+    data = request.get_json(silent=True) or {}
+    predicted_delay = data.get('predicted_delay') or 0
+    if not isinstance(data.get('train_id'), str): return jsonify({'error': "'train_id' must be a string"}), 400
+    if not is_number(predicted_delay): return jsonify({'error': "'predicted_delay' must be a number"}), 400
+    params = {}
+    for name, default, integer in (('seed', DEFAULT_SEED, True), ('headway_minutes', MIN_HEADWAY_MINUTES, False)):
+        params[name], error = read_number(data, name, default, integer=integer)
+        if error: return jsonify({'error': error}), 400
+    impact_data = calculate_cascade_impact(data['train_id'], predicted_delay, **params)
     
     # Restructure the response to match the frontend's expected format
     response = {
@@ -193,7 +470,7 @@ def analyze_impact():
         'affected_train_count': impact_data.get('affected_count'),
         'total_delay_minutes': impact_data.get('total_impact_minutes'),
         'affected_trains': [
-            {'train_id': t['id'], 'additional_delay': t['additional_delay']}
+            {'train_id': t['id'], 'additional_delay': t['additional_delay'], 'station': t['station'], 'caused_by': t['caused_by']}
             for t in impact_data.get('affected_trains', [])
         ]
     }
@@ -215,31 +492,57 @@ def get_recommendations_route():
     return jsonify(response)
 
 
+@app.route('/what_if', methods=['POST'])
+def what_if():
+    """Compares candidate interventions by simulating each one forward from the current state.
+
+    Body: {"candidates": [{"name": ..., "actions": [{"train_id": ..., "delay_minutes": ...}]}], "hours": 2}
+    """
+    data = request.get_json(silent=True) or {}
+    candidates = data.get('candidates')
+    if not isinstance(candidates, list): return jsonify({'error': "'candidates' must be a list"}), 400
+    for candidate in candidates:
+        actions = candidate.get('actions', []) if isinstance(candidate, dict) else None
+        if not isinstance(actions, list) or not all(
+                isinstance(a, dict) and isinstance(a.get('train_id'), str) and is_number(a.get('delay_minutes')) for a in actions):
+            return jsonify({'error': "Each candidate must be {'name', 'actions': [{'train_id': str, 'delay_minutes': number}]}"}), 400
+    params = {}
+    for name, default, integer, positive in (('hours', 2, False, True), ('step_minutes', 5, False, True), ('seed', DEFAULT_SEED, True, False)):
+        params[name], error = read_number(data, name, default, integer=integer, positive=positive)
+        if error: return jsonify({'error': error}), 400
+    # Runs in worker processes on a copy of the state, so the live simulation keeps going.
+    with sim_clock.lock:
+        snapshot = simulator.snapshot()
+    results = compare_candidates(snapshot, candidates, **params)
+    return jsonify({'results': results, 'best': results[0]['name']})
+
 # --- 6. DEMO CONTROL ENDPOINTS ---
 @app.route('/reset_simulation', methods=['POST'])
 def reset_simulation():
-    global simulator
-    simulator = TrainSimulator()
+    global simulator, base_snapshot
+    # Pass {"reload": true} to re-read schedules instead of reusing the in-memory copy.
+    with sim_clock.lock:
+        if (request.get_json(silent=True) or {}).get('reload'):
+            schedule_loader.invalidate()
+            simulator = TrainSimulator()
+            base_snapshot = simulator.snapshot()
+        else:
+            simulator.restore(base_snapshot)
+        sim_clock.publish(resync=True)
     return jsonify({'message': 'Simulation has been reset.'})
 
 @app.route('/inject_scenario', methods=['POST']) # ENHANCED
 def inject_scenario():
     data = request.get_json()
-    scenario = data.get('scenario')
-    global simulator
-    simulator = TrainSimulator() # Reset before injecting for a clean start
-    
-    if scenario == 'single_breakdown':
-        simulator.add_delay_event("T-105", 25, cause="Engine Failure on Express Train")
-        simulator.add_delay_event("T-108", 5, cause="Congestion from T-105")
-        return jsonify({'message': 'Scenario: A critical Express Train has broken down, causing immediate congestion.'})
-    elif scenario == 'weather_disruption':
-        simulator.add_delay_event("T-102", 15, cause="Low visibility (Fog)")
-        simulator.add_delay_event("T-110", 20, cause="Low visibility (Fog)")
-        simulator.add_delay_event("T-115", 10, cause="Low visibility (Fog)")
-        simulator.add_delay_event("T-104", 12, cause="Low visibility (Fog)")
-        return jsonify({'message': 'Scenario: A sudden weather crisis is causing widespread network disruption.'})
-    
+    scenario = SCENARIOS.get(data.get('scenario'))
+    with sim_clock.lock:
+        simulator.restore(base_snapshot) # Reset before injecting for a clean start
+        for train_id, delay_minutes, cause in (scenario['events'] if scenario else []):
+            simulator.add_delay_event(train_id, delay_minutes, cause=cause)
+        sim_clock.publish(resync=True)
+
+    if scenario: return jsonify({'message': scenario['message']})
+
     return jsonify({'message': 'Normal operations restored.'})
 
 if __name__ == "__main__":
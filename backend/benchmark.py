@@ -0,0 +1,216 @@
+# backend/benchmark.py
+"""Benchmarks for the simulator, cascade, model and API hot paths at several fleet sizes.
+
+Runs fully offline: Supabase is replaced by an in-memory stand-in serving generated schedules,
+and a small model is trained into a scratch directory first. Results are written as JSON so two
+commits can be compared with --baseline.
+
+    python benchmark.py --sizes 20,1000,10000,100000 --out benchmark_results.json
+"""
+import os
+import sys
+import json
+import time
+import types
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+import numpy as np
+
+DEFAULT_SIZES = [20, 1000, 10000, 100000]
+TRAINING_ROWS = 20_000
+
+class StandInQuery:
+    """The slice of the Supabase query builder used by ScheduleLoader, served from a DataFrame."""
+    def __init__(self, frame):
+        self.frame = frame
+        self.start, self.end = 0, len(frame) - 1
+
+    def select(self, *args, **kwargs): return self
+    def order(self, *args, **kwargs): return self
+    def range(self, start, end):
+        self.start, self.end = start, end
+        return self
+
+    def execute(self):
+        # Rows are only turned into dicts page by page, like a real paginated response.
+        page = self.frame.iloc[self.start:self.end + 1].to_dict('records')
+        return types.SimpleNamespace(data=page)
+
+class StandInClient:
+    """In-memory replacement for the Supabase client: table name -> DataFrame of rows."""
+    def __init__(self, tables):
+        self.tables = tables
+
+    def table(self, name):
+        return StandInQuery(self.tables[name])
+
+def stand_in_client(n_trains, seed=0):
+    """A client whose 'schedules' table holds a generated network of `n_trains` trains."""
+    from data_generator import generate_schedules, STATIONS
+    schedules, _, _ = generate_schedules(n_trains, max(len(STATIONS), n_trains // 25), route_length=12, seed=seed)
+    schedules['scheduled_time'] = schedules['scheduled_time'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    return StandInClient({'schedules': schedules})
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    samples = np.array(samples) * 1000
+    return {'calls': len(samples), 'mean_ms': round(float(samples.mean()), 3), 'p50_ms': round(float(np.percentile(samples, 50)), 3),
+            'p99_ms': round(float(np.percentile(samples, 99)), 3), 'per_second': round(len(samples) / (samples.sum() / 1000), 1)}
+
+def timed(fn, repeat):
+    samples = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+def train_scratch_model(seed=0):
+    """Train a small model on generated delays and write it (pickle + compiled artifact) to the cwd."""
+    import joblib
+    from data_generator import generate_schedules, generate_delays
+    from train_enhanced_model import build_training_chunk
+    from improved_model import EnhancedDelayPredictor
+    from compiled_model import export_compiled_model
+    _, train_ids, is_express = generate_schedules(200, seed=seed)
+    rng = np.random.default_rng(seed)
+    chunks = (build_training_chunk(frame, rng) for frame in generate_delays(train_ids, is_express, TRAINING_ROWS, seed=seed))
+    predictor = EnhancedDelayPredictor()
+    predictor.train_streaming(chunks, seed=seed)
+    joblib.dump(predictor, 'enhanced_delay_model.pkl')
+    export_compiled_model(predictor)
+
+def bench_size(app, n_trains, args):
+    """Run every benchmark against a freshly loaded fleet of `n_trains` trains."""
+    from schedule_loader import ScheduleLoader
+    rng = np.random.default_rng(args.seed)
+    client = stand_in_client(n_trains, args.seed)
+    result = {'trains': n_trains, 'schedule_rows': len(client.tables['schedules'])}
+
+    # _load_initial_state: from the "database", from the local Parquet snapshot, and from memory.
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        load_times = {}
+        for source in ('database', 'snapshot'):
+            app.schedule_loader = ScheduleLoader(client, snapshot_dir=snapshot_dir, parquet_path=None,
+                                                 version=f'bench-{n_trains}')
+            started = time.perf_counter()
+            simulator = app.TrainSimulator()
+            load_times[source] = round(time.perf_counter() - started, 4)
+        started = time.perf_counter()
+        simulator._load_initial_state()
+        load_times['memory'] = round(time.perf_counter() - started, 4)
+    result['load_initial_state_seconds'] = load_times
+
+    # TrainSimulator.step with each engine, from the same starting state.
+    result['step'] = {}
+    for engine in ('object', 'vectorized'):
+        stepped = app.TrainSimulator(engine=engine)
+        started = time.perf_counter()
+        for _ in range(args.steps): stepped.step(minutes=5)
+        elapsed = time.perf_counter() - started
+        result['step'][engine] = {'steps': args.steps, 'steps_per_second': round(args.steps / elapsed, 2),
+                                  'train_updates_per_second': round(args.steps * n_trains / elapsed, 1)}
+
+    # Serve this fleet from the app, two simulated hours in so the network is busy.
+    app.simulator = simulator
+    for _ in range(24): simulator.step(minutes=5)
+    app.base_snapshot = simulator.snapshot()
+    app.sim_clock.publish(resync=True)
+    active_ids = [train_id for train_id, train in simulator.trains.items() if train.status != 'FINISHED']
+    sample_ids = [active_ids[i] for i in rng.integers(len(active_ids), size=max(args.repeat, args.cascade_repeat))] if active_ids else []
+    result['active_trains'] = len(active_ids)
+
+    if sample_ids:
+        result['calculate_cascade_impact'] = timed(lambda i: app.calculate_cascade_impact(sample_ids[i], 30), args.cascade_repeat)
+
+    predictor = app.enhanced_predictor
+    if predictor is not None and active_ids:
+        features = [{'hour': 10, 'day_of_week': 4, 'priority': 1 if 'Express' in train_id else 2, 'initial_delay': int(delay),
+                     'weather_severity': 1, 'congestion': 0.5} for train_id, delay in zip(sample_ids, rng.integers(0, 40, len(sample_ids)))]
+        result['predict_with_explanation'] = timed(lambda i: predictor.predict_with_explanation(features[i]), args.repeat)
+        batch = [dict(features[0], initial_delay=simulator.trains[train_id].current_delay) for train_id in active_ids]
+        batch_result = timed(lambda i: predictor.predict_batch(batch), 3)
+        batch_result['rows'] = len(batch)
+        batch_result['rows_per_second'] = round(len(batch) / (batch_result['mean_ms'] / 1000), 1)
+        result['predict_batch'] = batch_result
+
+    # End to end through Flask's test client.
+    http = app.app.test_client()
+    requests = {
+        '/simulation_state': lambda i: http.get('/simulation_state'),
+        '/kpis': lambda i: http.get('/kpis'),
+        '/predict_delay': lambda i: http.post('/predict_delay', json={'train_id': sample_ids[i]}),
+        '/analyze_impact': lambda i: http.post('/analyze_impact', json={'train_id': sample_ids[i], 'predicted_delay': 30})
+    }
+    result['http'] = {}
+    for path, send in requests.items():
+        if not sample_ids and path in ('/predict_delay', '/analyze_impact'): continue
+        result['http'][path] = timed(send, args.cascade_repeat if path == '/analyze_impact' else args.repeat)
+    return result
+
+def compare(results, baseline_path):
+    """Print the change in every p50/per-second figure against a previous results file."""
+    with open(baseline_path) as f:
+        baseline = {run['trains']: run for run in json.load(f)['results']}
+    def walk(current, previous, path):
+        for name, value in current.items():
+            if isinstance(value, dict) and isinstance(previous.get(name), dict):
+                walk(value, previous[name], path + [name])
+            elif name in ('p50_ms', 'p99_ms', 'per_second', 'steps_per_second', 'rows_per_second') and previous.get(name):
+                change = (value - previous[name]) / previous[name] * 100
+                print(f"  {' '.join(path + [name])}: {previous[name]} -> {value} ({change:+.1f}%)")
+    for run in results:
+        if run['trains'] in baseline:
+            print(f"{run['trains']} trains vs {baseline_path}:")
+            walk(run, baseline[run['trains']], [])
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(args):
+    out_path, baseline_path = os.path.abspath(args.out), args.baseline and os.path.abspath(args.baseline)
+    commit = git_commit()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)  # app.py reads the model and writes its schedule snapshot relative to the cwd.
+        os.environ.update({'SIM_TICK_SECONDS': '0', 'ONLINE_UPDATE_SECONDS': '0', 'SUPABASE_URL': 'http://stand-in', 'SUPABASE_KEY': 'stand-in'})
+        os.environ.pop('SCHEDULES_PARQUET', None)
+        print("Training a scratch model...")
+        train_scratch_model(args.seed)
+
+        import supabase
+        supabase.create_client = lambda url, key: stand_in_client(args.sizes[0], args.seed)
+        import app
+
+        results = []
+        for n_trains in args.sizes:
+            print(f"Benchmarking {n_trains} trains...")
+            results.append(bench_size(app, n_trains, args))
+            print(json.dumps(results[-1], indent=2))
+        app.sim_clock.stop()
+        app.online_updater.stop()
+
+    report = {'commit': commit, 'recorded_at': datetime.now(timezone.utc).isoformat(), 'python': platform.python_version(),
+              'numpy': np.__version__, 'cpu_count': os.cpu_count(), 'repeat': args.repeat, 'cascade_repeat': args.cascade_repeat, 'results': results}
+    with open(out_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Benchmark results written to {out_path}")
+    if baseline_path: compare(results, baseline_path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the simulator, model and API at several fleet sizes.")
+    parser.add_argument('--sizes', type=lambda s: [int(n) for n in s.split(',')], default=DEFAULT_SIZES, help="Comma-separated fleet sizes.")
+    parser.add_argument('--repeat', type=int, default=200, help="Calls per latency measurement.")
+    parser.add_argument('--cascade-repeat', type=int, default=20, help="Calls per cascade measurement, which is seconds per call on large dense fleets.")
+    parser.add_argument('--steps', type=int, default=24, help="5-minute simulator steps per throughput measurement.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='benchmark_results.json')
+    parser.add_argument('--baseline', help="A previous results file to compare against.")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))  # Imports must survive the chdir into the scratch directory.
+    run_benchmarks(parser.parse_args())
@@ -0,0 +1,101 @@
+import heapq
+import numpy as np
+
+MIN_HEADWAY_MINUTES = 5      # Minimum gap between two trains passing through the same station.
+MAX_RECOVERY_MINUTES = 2.0   # Most a delayed train can win back per stop (dwell/running-time slack).
+REPORT_THRESHOLD_MINUTES = 5 # Knock-on delays at or below this are not reported.
+DEFAULT_SEED = 42
+RECOVERY_DRAWS = 1024        # Recovery draws taken from the RNG per call; scalar draws cost more than the rest of an event.
+
+class CascadePropagator:
+    """Pushes a primary delay through the timetable as knock-on delays at shared stations.
+
+    Trains keep their timetable order at every station (no overtaking) and must pass at least
+    `headway_minutes` after the train ahead, or their timetabled spacing if that is tighter.
+    Events are handled in order of actual time from a priority queue, so a knock-on delay can
+    chain through any number of trains (A delays B delays C).
+    At each stop a train may recover up to `max_recovery_minutes`, drawn from a seeded RNG.
+    Work is proportional to the (train, stop) events that are actually delayed.
+    """
+    def __init__(self, trains, station_index, current_time, headway_minutes=MIN_HEADWAY_MINUTES,
+                 max_recovery_minutes=MAX_RECOVERY_MINUTES, seed=DEFAULT_SEED):
+        self.trains = trains
+        self.station_index = station_index
+        self.current_time = current_time
+        self.now = current_time.timestamp() / 60
+        self.headway = headway_minutes
+        self.max_recovery = max_recovery_minutes
+        self.rng = np.random.default_rng(seed)
+        self._recoveries = iter(())
+        self._followers = {}  # (train id, stop index) -> its follower; a stop can be re-processed with a larger delay
+        delays = [train.current_delay for train in trains.values()]
+        self.min_delay, self.max_delay = (min(delays), max(delays)) if delays else (0, 0)
+
+    def _expected(self, train_id, col):
+        """Expected minutes from now at a stop, before this cascade."""
+        return self.station_index.scheduled_minutes[train_id][col] - self.now + self.trains[train_id].current_delay
+
+    def _recovery(self):
+        # Same sequence as one rng.uniform call per stop, drawn in blocks.
+        recovery = next(self._recoveries, None)
+        if recovery is None:
+            self._recoveries = iter(self.rng.uniform(0, self.max_recovery, RECOVERY_DRAWS).tolist())
+            recovery = next(self._recoveries)
+        return recovery
+
+    def _follower(self, station, stop):
+        """The stop that comes next after `stop` (expected minutes, train id, stop index) at `station`.
+
+        Expected time is scheduled time plus current delay, so only stops scheduled within the fleet's
+        delay range of ours can be next; the timetable-ordered scan stops once none can beat the best so far.
+        """
+        key = stop[1:]
+        if key in self._followers: return self._followers[key]
+        best = None
+        for minutes, train_id, col in self.station_index.stops_after(station, stop[0] + self.now - self.max_delay):
+            if best is not None and minutes - self.now + self.min_delay > best[0]: break
+            candidate = (minutes - self.now + self.trains[train_id].current_delay, train_id, col)
+            if candidate > stop and (best is None or candidate < best): best = candidate
+        self._followers[key] = best
+        return best
+
+    def propagate(self, primary_train_id, primary_delay_minutes):
+        """Return {train_id: {'additional_delay', 'station', 'caused_by', 'hops'}} for every knock-on delay."""
+        primary = self.trains[primary_train_id]
+        latest = {}    # (train id, stop index) -> latest actual time pushed for that stop
+        knock_on = {}
+        events = []
+
+        def push(train_id, col, delay, caused_by, hops):
+            actual = self._expected(train_id, col) + delay
+            if actual <= latest.get((train_id, col), float('-inf')): return
+            latest[(train_id, col)] = actual
+            heapq.heappush(events, (actual, train_id, col, delay, caused_by, hops))
+
+        push(primary_train_id, primary.current_station_index, float(primary_delay_minutes), None, 0)
+        while events:
+            actual, train_id, col, delay, caused_by, hops = heapq.heappop(events)
+            if actual < latest[(train_id, col)]: continue  # superseded by a larger delay at the same stop
+            train = self.trains[train_id]
+            station = train.schedule[col][0]
+
+            # The next train through this station must keep the headway behind us.
+            expected = self._expected(train_id, col)
+            follower = self._follower(station, (expected, train_id, col))
+            if follower is not None:
+                follower_expected, follower_id, follower_col = follower
+                follower_actual = latest.get((follower_id, follower_col), follower_expected)
+                # A timetable that already runs tighter than the headway keeps its own spacing.
+                spacing = min(self.headway, follower_expected - expected)
+                if actual + spacing > follower_actual:
+                    follower_delay = actual + spacing - follower_expected
+                    push(follower_id, follower_col, follower_delay, train_id, hops + 1)
+                    if follower_id != primary_train_id and follower_delay > knock_on.get(follower_id, {}).get('additional_delay', 0):
+                        knock_on[follower_id] = {'additional_delay': follower_delay, 'station': station, 'caused_by': train_id, 'hops': hops + 1}
+
+            # Carry the remaining delay to our next stop; we cannot get there before leaving this one.
+            if col + 1 < len(train.schedule):
+                next_expected = self._expected(train_id, col + 1)
+                carried = max(delay - self._recovery(), actual - next_expected)
+                if carried > 0: push(train_id, col + 1, carried, caused_by, hops)
+        return knock_on
@@ -0,0 +1,113 @@
+import os
+import copy
+import json
+import numpy as np
+import xgboost as xgb
+from improved_model import EnhancedDelayPredictor, XGB_PARAMS
+from metrics import timed
+
+ARRAYS_PATH = 'enhanced_delay_model.npz'
+BOOSTER_PATH = 'enhanced_delay_model_xgb.ubj'
+
+def _flatten_forest(forest):
+    """Concatenate every tree of a fitted RandomForestRegressor into flat node arrays.
+
+    Leaves point back at themselves (with an infinite threshold), so a fixed number of
+    traversal steps lands every sample on its leaf regardless of the tree's depth.
+    """
+    lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        nodes = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+        lefts.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+        rights.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+        values.append(tree.value[:, 0, 0])
+        roots.append(offset)
+        offset += tree.node_count
+    return {
+        'rf_left': np.concatenate(lefts).astype(np.int32),
+        'rf_right': np.concatenate(rights).astype(np.int32),
+        'rf_feature': np.concatenate(features).astype(np.int32),
+        'rf_threshold': np.concatenate(thresholds).astype(np.float64),
+        'rf_value': np.concatenate(values).astype(np.float64),
+        'rf_roots': np.array(roots, dtype=np.int32),
+        'rf_depth': np.array(max(e.tree_.max_depth for e in forest.estimators_))
+    }
+
+def export_compiled_model(predictor, arrays_path=ARRAYS_PATH, booster_path=BOOSTER_PATH):
+    """Write the inference artifact: native XGBoost booster plus RF/LR flattened into one .npz."""
+    predictor.models['xgb'].get_booster().save_model(booster_path)
+    normal_equations = getattr(predictor, 'lr_normal_equations', None)
+    normal_equations = {} if normal_equations is None else dict(zip(('lr_gram', 'lr_moment'), normal_equations))
+    np.savez(
+        arrays_path,
+        feature_names=np.array(predictor.feature_names),
+        weight_names=np.array(list(predictor.model_weights.keys())),
+        weights=np.array(list(predictor.model_weights.values()), dtype=np.float64),
+        lr_coef=np.asarray(predictor.models['lr'].coef_, dtype=np.float64),
+        lr_intercept=np.array(predictor.models['lr'].intercept_, dtype=np.float64),
+        xgb_params=np.array(json.dumps(getattr(predictor, 'xgb_params', XGB_PARAMS))),
+        **normal_equations,
+        **_flatten_forest(predictor.models['rf'])
+    )
+
+def compiled_model_exists(arrays_path=ARRAYS_PATH, booster_path=BOOSTER_PATH):
+    return os.path.exists(arrays_path) and os.path.exists(booster_path)
+
+class CompiledDelayPredictor(EnhancedDelayPredictor):
+    """EnhancedDelayPredictor served from the exported artifact, without sklearn.
+
+    XGBoost runs from its native booster; the random forest is walked level by level for all
+    samples and trees at once, and the linear model is a single dot product.
+    """
+    def __init__(self, arrays_path=ARRAYS_PATH, booster_path=BOOSTER_PATH):
+        super().__init__()
+        with np.load(arrays_path) as arrays:
+            self.arrays = {name: arrays[name] for name in arrays.files}
+        self.feature_names = self.arrays['feature_names'].tolist()
+        self.model_weights = dict(zip(self.arrays['weight_names'].tolist(), self.arrays['weights'].tolist()))
+        self.xgb_params = json.loads(self.arrays['xgb_params'].item()) if 'xgb_params' in self.arrays else dict(XGB_PARAMS)
+        if 'lr_gram' in self.arrays: self.lr_normal_equations = (self.arrays['lr_gram'], self.arrays['lr_moment'])
+        self.booster = xgb.Booster()
+        self.booster.load_model(booster_path)
+        self.is_trained = True
+
+    def _predict_forest(self, features_arr):
+        a = self.arrays
+        # sklearn compares float32 inputs against the stored thresholds; do the same for identical splits.
+        samples = features_arr.astype(np.float32)
+        rows = np.arange(len(samples))[:, None]
+        nodes = np.broadcast_to(a['rf_roots'], (len(samples), len(a['rf_roots']))).copy()
+        for _ in range(int(a['rf_depth'])):
+            go_left = samples[rows, a['rf_feature'][nodes]] <= a['rf_threshold'][nodes]
+            nodes = np.where(go_left, a['rf_left'][nodes], a['rf_right'][nodes])
+        return a['rf_value'][nodes].mean(axis=1)
+
+    def _member_predictions(self, features_arr):
+        features_arr = np.asarray(features_arr, dtype=np.float64)
+        members = {
+            'xgb': lambda: self.booster.inplace_predict(features_arr),
+            'rf': lambda: self._predict_forest(features_arr),
+            'lr': lambda: features_arr @ self.arrays['lr_coef'] + self.arrays['lr_intercept']
+        }
+        predictions = {}
+        for name in self.model_weights:
+            with timed(f'predict_{name}'): predictions[name] = members[name]()
+        return predictions
+
+    def _xgb_booster(self):
+        return self.booster
+
+    def _lr_solution(self):
+        return np.append(self.arrays['lr_coef'], self.arrays['lr_intercept'])
+
+    def _with_updates(self, booster, solution, normal_equations):
+        updated = copy.copy(self)
+        updated.booster = booster
+        updated.arrays = dict(self.arrays, lr_coef=solution[:-1], lr_intercept=np.array(solution[-1]))
+        updated.lr_normal_equations = normal_equations
+        return updated
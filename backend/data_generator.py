@@ -1,62 +1,193 @@
 # backend/data_generator.py
 import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from supabase import create_client, Client
+import pyarrow as pa
+import pyarrow.parquet as pq
 from dotenv import load_dotenv
 
 load_dotenv('.env') # Load .env file from parent directory
 
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
-
 STATIONS = ['Delhi', 'Palwal', 'Kosi Kalan', 'Mathura', 'Raja Ki Mandi', 'Agra']
 CAUSES = ['Signal Failure', 'Weather', 'Congestion', 'Maintenance']
 WEATHER = ['Clear', 'Rainy', 'Foggy']
+SCHEDULE_DATE = np.datetime64('2023-10-27T00:00')  # The day TrainSimulator starts on.
+HISTORY_START = np.datetime64('2023-10-23T00:00')  # A Monday, so multi-day delay histories cover every weekday.
+PEAK_HOURS = [7, 8, 9, 17, 18, 19]
 
-def generate_and_upload():
-    # --- Generate Schedules Data ---
-    schedules = []
-    for i in range(20):
-        train_id = f"T-{100+i}"
-        start_time = datetime(2023, 10, 27, np.random.randint(5, 22), np.random.randint(0, 59))
-        for j, station in enumerate(STATIONS):
-            schedules.append({
-                'train_id': train_id, 
-                'station_name': station, 
-                'scheduled_time': (start_time + timedelta(minutes=j*45)).isoformat()
-            })
-    
-    # --- Generate Delays Data ---
-    delays = []
-    for _ in range(1200):
-        train_id = f"T-{100+np.random.randint(0, 20)}"
-        recorded_at = datetime(2023, 10, 27, np.random.randint(0, 23), np.random.randint(0, 59))
-        weather = np.random.choice(WEATHER, p=[0.7, 0.2, 0.1])
-        cause = np.random.choice(CAUSES, p=[0.2, 0.3, 0.4, 0.1])
-        base_delay = np.random.randint(5, 30)
-        if weather == 'Foggy': base_delay *= 2
-        if cause == 'Signal Failure': base_delay += 20
-        delays.append({
-            'train_id': train_id, 
-            'delay_minutes': int(base_delay), 
-            'recorded_at': recorded_at.isoformat(), 
-            'cause': cause, 
-            'weather_condition': weather
+UPLOAD_CHUNK_ROWS = int(os.environ.get("UPLOAD_CHUNK_ROWS", 1000))  # Rows per insert request.
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", 4))          # Concurrent insert requests.
+UPLOAD_RETRIES = 3
+DELAY_CHUNK_ROWS = 500_000  # Delay records are generated and written this many at a time.
+
+def station_names(n_stations):
+    """The original corridor's names first, then numbered stations."""
+    return np.array(STATIONS[:n_stations] + [f"Station-{i}" for i in range(len(STATIONS), n_stations)], dtype=object)
+
+def generate_routes(n_stations, route_length, rng):
+    """Station-index sequences of every route. After the first, each route shares a stretch of an
+    existing route and then branches onto new stations, until every station is on some route."""
+    routes = [np.arange(min(route_length, n_stations))]
+    next_station = len(routes[0])
+    while next_station < n_stations:
+        parent = routes[rng.integers(len(routes))]
+        length = int(rng.integers(max(2, route_length // 2), route_length + route_length // 2 + 1))
+        shared = int(rng.integers(1, min(len(parent), length - 1) + 1))
+        offset = int(rng.integers(0, len(parent) - shared + 1))
+        branch = np.arange(next_station, min(next_station + length - shared, n_stations))
+        routes.append(np.concatenate([parent[offset:offset + shared], branch]))
+        next_station += len(branch)
+    return routes
+
+def generate_schedules(n_trains=20, n_stations=len(STATIONS), route_length=len(STATIONS), express_share=0.2, seed=0):
+    """Schedules DataFrame (train_id, station_name, scheduled_time) for a branching network.
+
+    Every route runs in both directions with fixed running times per segment, so trains on the
+    same route share stations at realistic spacings. Express trains run 20% faster.
+    Returns (schedules, train_ids, is_express).
+    """
+    rng = np.random.default_rng(seed)
+    routes = generate_routes(n_stations, route_length, rng)
+    # One "pattern" per route direction: padded station and cumulative-minute arrays.
+    patterns = routes + [route[::-1] for route in routes]
+    run_minutes = [rng.integers(20, 60, len(route) - 1) for route in routes]
+    offsets = [np.concatenate([[0], np.cumsum(m)]) for m in run_minutes]
+    offsets += [np.concatenate([[0], np.cumsum(m[::-1])]) for m in run_minutes]
+    lengths = np.array([len(p) for p in patterns])
+    pattern_stations = np.zeros((len(patterns), lengths.max()), dtype=np.int64)
+    pattern_offsets = np.zeros((len(patterns), lengths.max()), dtype=np.int64)
+    for i, (pattern, offset) in enumerate(zip(patterns, offsets)):
+        pattern_stations[i, :len(pattern)] = pattern
+        pattern_offsets[i, :len(offset)] = offset
+
+    n_express = int(round(n_trains * express_share))
+    train_ids = np.array([f"T-{100+i}" for i in range(n_trains - n_express)] + [f"Express-{100+i}" for i in range(n_express)], dtype=object)
+    is_express = np.arange(n_trains) >= n_trains - n_express
+    train_pattern = rng.integers(len(patterns), size=n_trains)
+    start_minute = rng.integers(5 * 60, 22 * 60, size=n_trains)
+    speed = np.where(is_express, 0.8, 1.0)
+
+    # One row per (train, stop): repeat each train over its pattern's length.
+    stops = lengths[train_pattern]
+    row_train = np.repeat(np.arange(n_trains), stops)
+    row_position = np.arange(len(row_train)) - np.repeat(np.cumsum(stops) - stops, stops)
+    row_pattern = train_pattern[row_train]
+    minutes = start_minute[row_train] + np.round(pattern_offsets[row_pattern, row_position] * speed[row_train]).astype(np.int64)
+    schedules = pd.DataFrame({
+        'train_id': train_ids[row_train],
+        'station_name': station_names(n_stations)[pattern_stations[row_pattern, row_position]],
+        'scheduled_time': SCHEDULE_DATE + minutes.astype('timedelta64[m]')
+    })
+    return schedules, train_ids, is_express
+
+def generate_delays(train_ids, is_express, n_delays=1200, days=7, seed=0, chunk_rows=DELAY_CHUNK_ROWS):
+    """Yield delay DataFrames (train_id, delay_minutes, recorded_at, cause, weather_condition).
+
+    Delays carry the same signals the model is trained on: longer at peak hours and on
+    weekdays, shorter for express trains, doubled in fog, worse in rain, +20 for signal failures.
+    """
+    rng = np.random.default_rng(seed + 1)
+    for start in range(0, n_delays, chunk_rows):
+        n = min(chunk_rows, n_delays - start)
+        trains = rng.integers(len(train_ids), size=n)
+        minute = rng.integers(0, days * 24 * 60, size=n)
+        hour, weekday = (minute // 60) % 24, (minute // (24 * 60)) % 7
+        # Fog is mostly an early-morning problem.
+        fog_p = np.where(hour < 9, 0.2, 0.05)
+        weather = np.where(rng.random(n) < fog_p, 2, np.where(rng.random(n) < 0.2, 1, 0))
+        cause = rng.choice(len(CAUSES), size=n, p=[0.2, 0.3, 0.4, 0.1])
+
+        base_delay = rng.integers(5, 30, size=n) + np.isin(hour, PEAK_HOURS) * rng.integers(0, 10, size=n) + (weekday < 5) * 3
+        base_delay = np.where(is_express[trains], base_delay * 0.7, base_delay)
+        base_delay = np.where(weather == 2, base_delay * 2, np.where(weather == 1, base_delay + 5, base_delay))
+        base_delay = base_delay + (cause == 0) * 20
+        yield pd.DataFrame({
+            'train_id': train_ids[trains],
+            'delay_minutes': np.round(base_delay).astype(int),
+            'recorded_at': HISTORY_START + minute.astype('timedelta64[m]'),
+            'cause': np.array(CAUSES, dtype=object)[cause],
+            'weather_condition': np.array(WEATHER, dtype=object)[weather]
         })
 
+def _to_records(frame):
+    """Insert payload for one chunk, with timestamps as ISO strings."""
+    frame = frame.copy()
+    for column in frame.select_dtypes('datetime').columns:
+        frame[column] = frame[column].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    return frame.to_dict('records')
+
+def _insert(client, table, frame):
+    for attempt in range(UPLOAD_RETRIES):
+        try:
+            client.table(table).insert(_to_records(frame)).execute()
+            return len(frame)
+        except Exception as e:
+            if attempt == UPLOAD_RETRIES - 1: raise
+            print(f"Insert into {table} failed ({e}); retrying...")
+            time.sleep(2 ** attempt)
+
+def upload_frames(client, table, frames, chunk_rows=UPLOAD_CHUNK_ROWS, workers=UPLOAD_WORKERS):
+    """Insert DataFrames in chunks of `chunk_rows` rows, `workers` requests at a time."""
+    uploaded, pending = 0, []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for frame in frames:
+            for start in range(0, len(frame), chunk_rows):
+                pending.append(pool.submit(_insert, client, table, frame.iloc[start:start + chunk_rows]))
+                # Bound the chunks held in memory to a couple per worker.
+                while len(pending) >= 2 * workers:
+                    uploaded += pending.pop(0).result()
+        uploaded += sum(future.result() for future in pending)
+    print(f"Uploaded {uploaded} rows to '{table}'.")
+
+def write_parquet(path, frames):
+    """Append DataFrames to one Parquet file, one row group per frame."""
+    writer, rows = None, 0
+    for frame in frames:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if writer is None: writer = pq.ParquetWriter(path, table.schema)
+        writer.write_table(table)
+        rows += len(frame)
+    if writer: writer.close()
+    print(f"Wrote {rows} rows to {path}.")
+
+def generate_and_upload(n_trains=20, n_stations=len(STATIONS), n_delays=1200, route_length=len(STATIONS),
+                        express_share=0.2, days=7, seed=0, out_dir=None):
+    """Generate a network and delay history, then upload it to Supabase or, with `out_dir`,
+    write schedules.parquet and delays.parquet there (see SCHEDULES_PARQUET and DELAYS_PARQUET)."""
+    # --- Generate Schedules Data ---
+    schedules, train_ids, is_express = generate_schedules(n_trains, n_stations, route_length, express_share, seed)
+    print(f"Generated {len(schedules)} schedule rows for {n_trains} trains over {n_stations} stations.")
+
+    # --- Generate Delays Data (streamed in chunks) ---
+    delays = generate_delays(train_ids, is_express, n_delays, days, seed)
+
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        write_parquet(os.path.join(out_dir, 'schedules.parquet'), [schedules])
+        write_parquet(os.path.join(out_dir, 'delays.parquet'), delays)
+        return
+
     # --- Upload to Supabase ---
+    from supabase import create_client
+    supabase = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY"))
     print("Uploading schedules to Supabase...")
-    # Supabase client prefers a list of dicts.
-    supabase.table('schedules').insert(schedules).execute()
-
+    upload_frames(supabase, 'schedules', [schedules])
     print("Uploading delays to Supabase...")
-    # For large uploads, it's better to chunk, but for 1200 records this is fine.
-    supabase.table('delays').insert(delays).execute()
-
+    upload_frames(supabase, 'delays', delays)
     print("Synthetic data uploaded successfully.")
 
 if __name__ == '__main__':
-    generate_and_upload()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate a synthetic rail network and delay history.")
+    parser.add_argument('--trains', type=int, default=20)
+    parser.add_argument('--stations', type=int, default=len(STATIONS))
+    parser.add_argument('--delays', type=int, default=1200)
+    parser.add_argument('--route-length', type=int, default=len(STATIONS), help="Typical stops per route.")
+    parser.add_argument('--express-share', type=float, default=0.2)
+    parser.add_argument('--days', type=int, default=7, help="Days of delay history.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="Write Parquet files to this directory instead of uploading.")
+    args = parser.parse_args()
+    generate_and_upload(args.trains, args.stations, args.delays, args.route_length, args.express_share, args.days, args.seed, args.out)
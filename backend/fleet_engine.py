@@ -0,0 +1,94 @@
+import copy
+import numpy as np
+
+STATUS_NAMES = ['ON_TIME', 'DELAYED', 'FINISHED']
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+ON_TIME, DELAYED, FINISHED = 0, 1, 2
+
+# Padding for ragged schedules; far enough in the future that a padded stop is never reached.
+NEVER = np.iinfo(np.int64).max // 2
+
+class FleetEngine:
+    """Columnar copy of the fleet: every train's schedule and live state held in NumPy arrays.
+
+    Times are int64 minutes relative to the simulator's start time and station names are
+    interned to small ints, so one `step` advances the whole fleet with array operations.
+    """
+    def __init__(self, trains, start_time):
+        self.start_time = start_time
+        self.now = 0
+        self.train_ids = list(trains.keys())
+        self.row_of = {train_id: row for row, train_id in enumerate(self.train_ids)}
+        self.station_names = []
+        self.station_codes = {}
+
+        width = max((len(t.schedule) for t in trains.values()), default=1)
+        self.scheduled = np.full((len(self.train_ids), width), NEVER, dtype=np.int64)
+        self.stations = np.full((len(self.train_ids), width), -1, dtype=np.int32)
+        self.length = np.zeros(len(self.train_ids), dtype=np.int32)
+        for row, train in enumerate(trains.values()):
+            self.length[row] = len(train.schedule)
+            for col, (station, scheduled_time) in enumerate(train.schedule):
+                self.scheduled[row, col] = self._to_minutes(scheduled_time)
+                self.stations[row, col] = self._intern(station)
+
+        self.index = np.array([t.current_station_index for t in trains.values()], dtype=np.int32)
+        self.delay = np.array([t.current_delay for t in trains.values()], dtype=np.int64)
+        self.status = np.array([STATUS_CODES[t.status] for t in trains.values()], dtype=np.int8)
+
+    def fork(self):
+        """Copy of the live state (index, delay, status, clock); schedule arrays are shared."""
+        forked = copy.copy(self)
+        forked.index, forked.delay, forked.status = self.index.copy(), self.delay.copy(), self.status.copy()
+        return forked
+
+    def _to_minutes(self, timestamp):
+        # Round up so "now >= scheduled" matches the datetime comparison in Train.update exactly.
+        seconds = (timestamp - self.start_time).total_seconds()
+        return int(-(-seconds // 60))
+
+    def _intern(self, station):
+        code = self.station_codes.get(station)
+        if code is None:
+            code = self.station_codes[station] = len(self.station_names)
+            self.station_names.append(station)
+        return code
+
+    def step(self, minutes=1):
+        """Advance every live train by `minutes`, jumping over as many stations as are now due.
+
+        Returns the row numbers of trains whose station index or status changed.
+        """
+        self.now += minutes
+        live = np.flatnonzero(self.status != FINISHED)
+        if live.size == 0: return live
+
+        cutoff = self.now - self.delay[live]
+        passed = (self.scheduled[live] <= cutoff[:, None]).sum(axis=1)
+        last = self.length[live] - 1
+        new_index = np.maximum(np.minimum(passed, last), self.index[live])
+        finished = passed > last
+
+        moved = new_index != self.index[live]
+        self.index[live] = new_index
+        self.status[live[finished]] = FINISHED
+        return live[moved | finished]
+
+    def add_delay(self, train_id, delay_minutes):
+        row = self.row_of[train_id]
+        self.delay[row] += delay_minutes
+        self.status[row] = DELAYED
+
+    def sync_trains(self, trains, rows):
+        """Write the array state of `rows` back onto the matching Train objects.
+
+        Returns (train, previous_status) pairs so callers can react to status transitions.
+        """
+        synced = []
+        for row in rows.tolist():
+            train = trains[self.train_ids[row]]
+            previous_status = train.status
+            train.current_station_index = int(self.index[row])
+            train.status = STATUS_NAMES[self.status[row]]
+            synced.append((train, previous_status))
+        return synced
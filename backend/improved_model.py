@@ -1,8 +1,50 @@
+import os
+import copy
+import time
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import xgboost as xgb
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.linear_model import LinearRegression
 import numpy as np
+import pandas as pd
 import joblib
+from metrics import timed
+
+PEAK_HOURS = [7, 8, 9, 17, 18, 19]
+# Column order for the raw inputs accepted by create_feature_matrix when given a plain array.
+BASIC_FEATURES = ['hour', 'day_of_week', 'priority', 'initial_delay', 'weather_severity', 'congestion']
+BASIC_DEFAULTS = {'hour': 0, 'day_of_week': 0, 'priority': 2, 'initial_delay': 0, 'weather_severity': 0, 'congestion': 0.5}
+FEATURE_NAMES = ['hour_of_day', 'is_peak_hour', 'day_of_week', 'is_weekend', 'train_priority', 'initial_delay',
+                 'weather_severity', 'network_congestion', 'delay_hour_interaction', 'weather_congestion_interaction']
+
+XGB_PARAMS = {'max_depth': 4, 'objective': 'reg:squarederror'}
+XGB_ROUNDS = 50
+RF_PARAMS = {'n_estimators': 30, 'max_depth': 6}
+RF_SAMPLE_SIZE = 200_000  # The random forest fits a uniform sample of at most this many rows.
+ONLINE_XGB_ROUNDS = 5     # Boosting rounds added by each online update.
+ONLINE_PRIOR_ROWS = 1000  # Models saved without their normal equations: rows the existing linear fit counts as.
+
+def basic_feature_frame(basic_features):
+    """DataFrame of basic inputs from a DataFrame, dict of columns, list of dicts, or BASIC_FEATURES-ordered array."""
+    if isinstance(basic_features, np.ndarray):
+        return pd.DataFrame(basic_features.reshape(-1, len(BASIC_FEATURES)), columns=BASIC_FEATURES)
+    return pd.DataFrame(basic_features)
+
+class _SpooledChunks(xgb.DataIter):
+    """Feeds (X, y) chunks spooled to .npy files to XGBoost one at a time."""
+    def __init__(self, paths):
+        self.paths = paths
+        self._position = 0
+        super().__init__()
+
+    def next(self, input_data):
+        if self._position == len(self.paths): return False
+        features_path, target_path = self.paths[self._position]
+        input_data(data=np.load(features_path), label=np.load(target_path))
+        self._position += 1
+        return True
+
+    def reset(self):
+        self._position = 0
 
 class EnhancedDelayPredictor:
     def __init__(self):
@@ -10,6 +52,9 @@ class EnhancedDelayPredictor:
         self.feature_names = []
         self.is_trained = False
         self.model_weights = {}
+        self.training_report = {}
+        self.xgb_params = dict(XGB_PARAMS)
+        self.lr_normal_equations = None  # (gram, moment) over every row seen, for online linear updates.
 
     def create_advanced_features(self, basic_features):
         """Create railway-specific features from a dictionary of basic inputs."""
@@ -21,7 +66,7 @@ class EnhancedDelayPredictor:
 
         features = {
             'hour_of_day': hour,
-            'is_peak_hour': 1 if hour in [7, 8, 9, 17, 18, 19] else 0,
+            'is_peak_hour': 1 if hour in PEAK_HOURS else 0,
             'day_of_week': day,
             'is_weekend': 1 if day >= 5 else 0,
             'train_priority': basic_features.get('priority', 2),
@@ -33,46 +78,177 @@ class EnhancedDelayPredictor:
         }
         return list(features.values()), list(features.keys())
 
-    def train(self, training_data):
-        """Train an ensemble of models on historical data."""
+    def create_feature_matrix(self, basic_features):
+        """Vectorized create_advanced_features: one row per train, columns in the same order.
+
+        Accepts a DataFrame (or dict of columns) keyed like the basic inputs, or an array whose
+        columns follow BASIC_FEATURES.
+        """
+        frame = basic_feature_frame(basic_features)
+        column = lambda name: frame[name].to_numpy(dtype=float) if name in frame else np.full(len(frame), float(BASIC_DEFAULTS[name]))
+        hour, day = column('hour'), column('day_of_week')
+        initial_delay, weather_severity, congestion = column('initial_delay'), column('weather_severity'), column('congestion')
+        return np.column_stack([
+            hour,
+            np.isin(hour, PEAK_HOURS),
+            day,
+            day >= 5,
+            column('priority'),
+            initial_delay,
+            weather_severity,
+            congestion,
+            initial_delay * hour,
+            weather_severity * congestion
+        ]).astype(float)
+
+    def train(self, training_data, seed=42, **options):
+        """Train an ensemble of models on historical data: a list of {'features': {...}, 'delay_minutes': n} records."""
+        basic_features = pd.DataFrame([record['features'] for record in training_data])
+        delays = np.array([record['delay_minutes'] for record in training_data])
+        self.train_streaming([(basic_features, delays)], seed=seed, **options)
+
+    def train_streaming(self, chunks, seed=42, rf_sample_size=RF_SAMPLE_SIZE, tune=False, folds=5, max_trials=8, workers=None):
+        """Train the ensemble from an iterable of (basic feature frame, delay array) chunks.
+
+        Memory stays bounded by one chunk plus the forest's sample: chunks are spooled to disk and
+        streamed into XGBoost's QuantileDMatrix, the linear model is solved from accumulated normal
+        equations, and the random forest fits a uniform reservoir sample of all rows.
+
+        With tune=True, k-fold cross-validation on that sample runs across a process pool to pick
+        XGBoost parameters (bounded search with early stopping) and blend weights from
+        out-of-fold predictions. Wall-clock time per stage lands in `training_report`.
+        """
         print("Starting enhanced model training...")
-        X, y = [], []
-        for record in training_data:
-            features, names = self.create_advanced_features(record['features'])
-            X.append(features)
-            y.append(record['delay_minutes'])
-
-        X = np.array(X)
-        y = np.array(y)
-        self.feature_names = names
-        
-        self.models = {
-            'xgb': xgb.XGBRegressor(n_estimators=50, max_depth=4, random_state=42),
-            'rf': RandomForestRegressor(n_estimators=30, max_depth=6, random_state=42),
-            'lr': LinearRegression()
-        }
-        
-        for name, model in self.models.items():
-            print(f"Training {name} model...")
-            model.fit(X, y)
-        
-        self.model_weights = self._calculate_weights(X, y)
+        # sklearn is only needed to fit; the compiled artifact serves predictions without it.
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.linear_model import LinearRegression
+
+        stage_seconds = {}
+        stage_start = time.perf_counter()
+        def end_stage(name):
+            nonlocal stage_start
+            now = time.perf_counter()
+            stage_seconds[name] = round(now - stage_start, 3)
+            print(f"  {name}: {stage_seconds[name]}s")
+            stage_start = now
+
+        rng = np.random.default_rng(seed)
+        n_features = len(FEATURE_NAMES)
+        gram, moment = np.zeros((n_features + 1, n_features + 1)), np.zeros(n_features + 1)
+        sample_keys, sample_X, sample_y = np.empty(0), np.empty((0, n_features)), np.empty(0)
+        rows = 0
+        with tempfile.TemporaryDirectory() as spool_dir:
+            paths = []
+            for basic_features, delays in chunks:
+                X, y = self.create_feature_matrix(basic_features), np.asarray(delays, dtype=float)
+                if len(X) == 0: continue
+                path = (os.path.join(spool_dir, f'X{len(paths)}.npy'), os.path.join(spool_dir, f'y{len(paths)}.npy'))
+                np.save(path[0], X)
+                np.save(path[1], y)
+                paths.append(path)
+
+                with_intercept = np.column_stack([X, np.ones(len(X))])
+                gram += with_intercept.T @ with_intercept
+                moment += with_intercept.T @ y
+
+                # Reservoir sample: keep the rows with the smallest random keys seen so far.
+                sample_keys = np.concatenate([sample_keys, rng.random(len(X))])
+                sample_X, sample_y = np.vstack([sample_X, X]), np.concatenate([sample_y, y])
+                if len(sample_keys) > rf_sample_size:
+                    keep = np.argpartition(sample_keys, rf_sample_size)[:rf_sample_size]
+                    sample_keys, sample_X, sample_y = sample_keys[keep], sample_X[keep], sample_y[keep]
+                rows += len(X)
+            if rows == 0: raise ValueError("No training data.")
+            print(f"Prepared {rows} rows in {len(paths)} chunks.")
+            end_stage('data_pass')
+
+            xgb_params, xgb_rounds = dict(XGB_PARAMS, seed=seed), XGB_ROUNDS
+            model_weights = None
+            if tune:
+                from model_selection import CrossValidator
+                with CrossValidator(sample_X, sample_y, folds=folds, seed=seed, workers=workers) as cross_validator:
+                    print(f"Searching xgb parameters ({max_trials} trials x {folds} folds)...")
+                    xgb_params, xgb_rounds, xgb_cv_rmse = cross_validator.search_xgb(xgb_params, max_trials=max_trials)
+                    self.training_report['xgb'] = {'params': xgb_params, 'rounds': xgb_rounds, 'cv_rmse': xgb_cv_rmse}
+                    end_stage('xgb_search')
+
+                    print("Deriving blend weights from out-of-fold predictions...")
+                    model_weights, cv_rmse = cross_validator.blend_weights(['xgb', 'rf', 'lr'], xgb_params, xgb_rounds)
+                    self.training_report['cv_rmse'] = cv_rmse
+                    print(f"Blend weights: {model_weights} (cv rmse {cv_rmse})")
+                    end_stage('cross_validation')
+
+            print(f"Training xgb (full data) and rf ({len(sample_y)} sampled rows) in parallel...")
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                xgb_future = pool.submit(lambda: xgb.train(xgb_params, xgb.QuantileDMatrix(_SpooledChunks(paths)), num_boost_round=xgb_rounds))
+                rf_future = pool.submit(RandomForestRegressor(**RF_PARAMS, random_state=seed).fit, sample_X, sample_y)
+                booster, rf_model = xgb_future.result(), rf_future.result()
+        xgb_model = xgb.XGBRegressor()
+        xgb_model.load_model(bytearray(booster.save_raw()))
+
+        print("Training lr model...")
+        solution = np.linalg.lstsq(gram, moment, rcond=None)[0]
+        lr_model = LinearRegression()
+        lr_model.coef_, lr_model.intercept_, lr_model.n_features_in_ = solution[:-1], solution[-1], n_features
+        end_stage('final_fit')
+
+        self.feature_names = list(FEATURE_NAMES)
+        self.models = {'xgb': xgb_model, 'rf': rf_model, 'lr': lr_model}
+        self.xgb_params, self.lr_normal_equations = xgb_params, (gram, moment)
+        self.model_weights = model_weights or self._calculate_weights(sample_X, sample_y)
+        self.training_report['stage_seconds'] = stage_seconds
+        self.training_report['rows'] = rows
         self.is_trained = True
         print("Enhanced model training complete.")
 
+    def partial_fit(self, basic_features, delays, xgb_rounds=ONLINE_XGB_ROUNDS):
+        """Return a copy of this predictor updated with new delay records; this one keeps serving unchanged.
+
+        XGBoost continues boosting from the current trees on the new rows, and the linear model is
+        re-solved from its accumulated normal equations plus the new rows. The random forest is
+        not updated online; it changes on the next full training run.
+        """
+        X, y = self.create_feature_matrix(basic_feature_frame(basic_features)), np.asarray(delays, dtype=float)
+        if len(X) == 0: return self
+        params = getattr(self, 'xgb_params', XGB_PARAMS)
+        booster = xgb.train(params, xgb.DMatrix(X, label=y), num_boost_round=xgb_rounds, xgb_model=self._xgb_booster())
+
+        normal_equations = getattr(self, 'lr_normal_equations', None)
+        if normal_equations is None:
+            # Without the training normal equations, treat the current fit as ONLINE_PRIOR_ROWS rows of evidence.
+            gram = ONLINE_PRIOR_ROWS * np.eye(X.shape[1] + 1)
+            normal_equations = (gram, gram @ self._lr_solution())
+        with_intercept = np.column_stack([X, np.ones(len(X))])
+        gram, moment = normal_equations[0] + with_intercept.T @ with_intercept, normal_equations[1] + with_intercept.T @ y
+        solution = np.linalg.lstsq(gram, moment, rcond=None)[0]
+        return self._with_updates(booster, solution, (gram, moment))
+
+    def _xgb_booster(self):
+        return self.models['xgb'].get_booster()
+
+    def _lr_solution(self):
+        return np.append(self.models['lr'].coef_, self.models['lr'].intercept_)
+
+    def _with_updates(self, booster, solution, normal_equations):
+        updated = copy.copy(self)
+        xgb_model = xgb.XGBRegressor()
+        xgb_model.load_model(bytearray(booster.save_raw()))
+        lr_model = copy.copy(self.models['lr'])
+        lr_model.coef_, lr_model.intercept_ = solution[:-1], solution[-1]
+        updated.models = dict(self.models, xgb=xgb_model, lr=lr_model)
+        updated.lr_normal_equations = normal_equations
+        return updated
+
     def predict_with_explanation(self, input_features):
         """Predict delay with confidence, a breakdown, and a human-readable explanation."""
         if not self.is_trained:
             raise Exception("Model is not trained. Please run the training script.")
         
-        features, _ = self.create_advanced_features(input_features)
-        features_arr = np.array(features).reshape(1, -1)
+        with timed('feature_build'):
+            features, _ = self.create_advanced_features(input_features)
+            features_arr = np.array(features).reshape(1, -1)
         
-        predictions = {}
-        for name, model in self.models.items():
-            # After (in improved_model.py):
-            pred_numpy = model.predict(features_arr)[0]
-            predictions[name] = float(round(pred_numpy, 2))
+        predictions = {name: float(round(pred[0], 2)) for name, pred in self._member_predictions(features_arr).items()}
         
         final_prediction = sum(self.model_weights[name] * pred for name, pred in predictions.items())
         
@@ -89,6 +265,45 @@ class EnhancedDelayPredictor:
             'risk_level': risk_level
         }
 
+    def predict_batch(self, basic_features):
+        """predict_with_explanation for a whole fleet: each ensemble member runs once on the full matrix."""
+        if not self.is_trained:
+            raise Exception("Model is not trained. Please run the training script.")
+
+        frame = basic_feature_frame(basic_features)
+        if frame.empty: return []
+        with timed('feature_build'):
+            features_arr = self.create_feature_matrix(frame)
+
+        predictions = {name: np.round(pred.astype(float), 2) for name, pred in self._member_predictions(features_arr).items()}
+        stacked = np.vstack(list(predictions.values()))
+        final_prediction = sum(self.model_weights[name] * pred for name, pred in predictions.items())
+        confidence = np.maximum(0.5, 1 - stacked.std(axis=0) / (np.abs(final_prediction) + 1e-6))
+
+        results = []
+        for i, row in enumerate(frame.to_dict('records')):
+            explanation, risk_level = self._generate_explanation_and_risk(row, final_prediction[i])
+            results.append({
+                'predicted_delay_minutes': max(0, round(float(final_prediction[i]), 2)),
+                'confidence_score': round(min(float(confidence[i]), 0.99), 2),
+                'model_breakdown': {name: float(pred[i]) for name, pred in predictions.items()},
+                'explanation': explanation,
+                'risk_level': risk_level
+            })
+        return results
+
+    def warm_up(self):
+        """Run one throwaway single and batch prediction so the first real request is not slowed by lazy setup."""
+        self.predict_with_explanation({})
+        self.predict_batch(np.zeros((8, len(BASIC_FEATURES))))
+
+    def _member_predictions(self, features_arr):
+        """Raw prediction array of each ensemble member, keyed by model name."""
+        predictions = {}
+        for name, model in self.models.items():
+            with timed(f'predict_{name}'): predictions[name] = model.predict(features_arr)
+        return predictions
+
     def _calculate_weights(self, X, y):
         # For a hackathon, equal weighting is robust and fast.
         # A production system would use cross-validation to find optimal weights.
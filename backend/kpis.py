@@ -0,0 +1,57 @@
+import copy
+from bisect import bisect_right
+from collections import deque
+
+MAX_TRACKED_DELAY = 240   # Delays above this share the histogram's last bucket.
+HISTORY_TICKS = 288       # Ring buffer length: 24 hours of 5-minute ticks.
+
+class KpiAggregator:
+    """Running fleet KPIs, updated in O(1) whenever a train's status or delay changes.
+
+    Keeps the active count, on-time count, delay sum and a per-minute delay histogram for
+    every train that has not finished, plus a ring buffer of per-tick snapshots for
+    hour-over-hour deltas.
+    """
+    def __init__(self, trains, history_ticks=HISTORY_TICKS):
+        self.active = 0
+        self.on_time = 0
+        self.delay_sum = 0
+        self.histogram = [0] * (MAX_TRACKED_DELAY + 1)
+        self.history = deque(maxlen=history_ticks)  # (time, active, on_time, delay_sum, p50, p95)
+        for train in trains.values(): self._count(train.status, train.current_delay, 1)
+
+    def fork(self):
+        forked = copy.copy(self)
+        forked.histogram = list(self.histogram)
+        forked.history = copy.copy(self.history)
+        return forked
+
+    def _count(self, status, delay, sign):
+        if status == 'FINISHED': return
+        self.active += sign
+        if status == 'ON_TIME': self.on_time += sign
+        self.delay_sum += sign * delay
+        self.histogram[min(max(int(delay), 0), MAX_TRACKED_DELAY)] += sign
+
+    def update(self, train, previous_status, previous_delay):
+        """Swap a train's old contribution for its current one."""
+        self._count(previous_status, previous_delay, -1)
+        self._count(train.status, train.current_delay, 1)
+
+    def percentile(self, q):
+        """Delay (minutes) at quantile q among active trains, read off the histogram."""
+        if self.active == 0: return 0
+        target, seen = q * self.active, 0
+        for delay, count in enumerate(self.histogram):
+            seen += count
+            if seen >= target: return delay
+        return MAX_TRACKED_DELAY
+
+    def record(self, current_time):
+        """Append this tick's snapshot to the ring buffer."""
+        self.history.append((current_time, self.active, self.on_time, self.delay_sum, self.percentile(0.5), self.percentile(0.95)))
+
+    def snapshot_before(self, when):
+        """Latest recorded snapshot at or before `when`, or None if the buffer does not reach back that far."""
+        position = bisect_right(self.history, when, key=lambda snapshot: snapshot[0])
+        return self.history[position - 1] if position else None
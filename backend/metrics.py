@@ -0,0 +1,136 @@
+import os
+import sys
+import time
+import bisect
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+# Upper bounds in seconds, from sub-millisecond model calls to multi-second cascades and loads.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STAGE_METRIC = 'rail_stage_duration_seconds'
+REQUEST_METRIC = 'rail_http_request_duration_seconds'
+IDLE_LEAVES = ('threading.py:wait', 'selectors.py:select')  # Threads parked here are idle, not working.
+METRIC_HELP = {
+    STAGE_METRIC: 'Time spent in instrumented stages (simulator step, serialization, cascade, model members, Supabase fetches).',
+    REQUEST_METRIC: 'Flask request handling time by endpoint, method and status.'
+}
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf.
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """Latency histograms keyed by metric name and labels, rendered in the Prometheus text format."""
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}  # (metric name, ((label, value), ...)) -> Histogram
+        self._lock = threading.Lock()
+
+    def observe(self, name, labels, seconds):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None: histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, labels, time.perf_counter() - started)
+
+    def render(self):
+        """All histograms as Prometheus text exposition (version 0.0.4)."""
+        with self._lock:
+            snapshot = sorted((key, list(h.counts), h.sum, h.count) for key, h in self._histograms.items())
+        lines, described = [], set()
+        for (name, labels), counts, total, count in snapshot:
+            if name not in described:
+                lines += [f'# HELP {name} {METRIC_HELP.get(name, name)}', f'# TYPE {name} histogram']
+                described.add(name)
+            label_text = ','.join(f'{label}="{_escape(value)}"' for label, value in labels)
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, bucket_count in zip(list(self.buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label_text}}} {total}')
+            lines.append(f'{name}_count{{{label_text}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+registry = MetricsRegistry()
+
+def timed(stage):
+    """Context manager recording the block's duration under rail_stage_duration_seconds{stage=...}."""
+    return registry.timer(STAGE_METRIC, stage=stage) if METRICS_ENABLED else nullcontext()
+
+class SamplingProfiler:
+    """Samples every thread's Python stack every `interval` seconds and counts identical stacks.
+
+    Output is in the collapsed-stack format ("outer;inner;leaf count") read by flamegraph.pl and
+    speedscope. Stacks of idle threads (the simulation clock waiting for its next tick, the
+    server waiting for connections) are left out.
+    """
+    def __init__(self, interval=0.01, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        stacks = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id: continue
+            names = []
+            leaf = f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}'
+            if leaf in IDLE_LEAVES: continue
+            while frame is not None and len(names) < self.max_depth:
+                code = frame.f_code
+                names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            stacks.append(';'.join(reversed(names)))
+        with self._lock:
+            self._stacks.update(stacks)
+            self.samples += 1
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def collapsed(self, limit=None):
+        """Collapsed stacks, most sampled first."""
+        with self._lock:
+            stacks = self._stacks.most_common(limit)
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks)
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
@@ -0,0 +1,101 @@
+import os
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import xgboost as xgb
+from scipy.optimize import nnls
+from improved_model import RF_PARAMS
+
+XGB_SEARCH_SPACE = {
+    'max_depth': [3, 4, 6],
+    'learning_rate': [0.05, 0.1, 0.3],
+    'min_child_weight': [1, 5],
+    'subsample': [0.8, 1.0]
+}
+MAX_BOOST_ROUNDS = 500
+EARLY_STOPPING_ROUNDS = 20
+
+# Each worker process receives the training sample once, through the pool initializer.
+_X = _y = None
+
+def _init_worker(X, y):
+    global _X, _y
+    _X, _y = X, y
+
+def _split(test_rows):
+    train_mask = np.ones(len(_y), dtype=bool)
+    train_mask[test_rows] = False
+    return train_mask
+
+def _xgb_fold(params, test_rows):
+    """Fit one fold with early stopping; returns (best validation RMSE, rounds used)."""
+    train_mask = _split(test_rows)
+    dtrain = xgb.DMatrix(_X[train_mask], label=_y[train_mask])
+    dvalid = xgb.DMatrix(_X[test_rows], label=_y[test_rows])
+    booster = xgb.train(dict(params, nthread=1, eval_metric='rmse'), dtrain, num_boost_round=MAX_BOOST_ROUNDS,
+                        evals=[(dvalid, 'valid')], early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False)
+    return booster.best_score, booster.best_iteration + 1
+
+def _member_fold(name, xgb_params, xgb_rounds, seed, test_rows):
+    """Out-of-fold predictions of one ensemble member for the rows in `test_rows`."""
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.linear_model import LinearRegression
+    train_mask = _split(test_rows)
+    X_train, y_train = _X[train_mask], _y[train_mask]
+    if name == 'xgb':
+        booster = xgb.train(dict(xgb_params, nthread=1), xgb.DMatrix(X_train, label=y_train), num_boost_round=xgb_rounds)
+        return booster.inplace_predict(_X[test_rows])
+    model = RandomForestRegressor(**RF_PARAMS, random_state=seed) if name == 'rf' else LinearRegression()
+    return model.fit(X_train, y_train).predict(_X[test_rows])
+
+class CrossValidator:
+    """k-fold cross-validation of the ensemble over a process pool.
+
+    `search_xgb` runs a bounded random search over XGB_SEARCH_SPACE with early stopping, and
+    `blend_weights` derives non-negative blend weights from out-of-fold predictions.
+    """
+    def __init__(self, X, y, folds=5, seed=42, workers=None):
+        self.rng = np.random.default_rng(seed)
+        self.seed = seed
+        self.test_folds = np.array_split(self.rng.permutation(len(y)), folds)
+        self.pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker, initargs=(X, y))
+        self.y = y
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.pool.shutdown()
+
+    def search_xgb(self, base_params, max_trials=8):
+        """Return (params, rounds, cv_rmse) of the best trial; the first trial is always `base_params`."""
+        keys = list(XGB_SEARCH_SPACE)
+        grid = [dict(zip(keys, values)) for values in itertools.product(*XGB_SEARCH_SPACE.values())]
+        picks = self.rng.choice(len(grid), size=min(max_trials - 1, len(grid)), replace=False)
+        trials = [dict(base_params)] + [dict(base_params, **grid[i]) for i in picks]
+
+        futures = [[self.pool.submit(_xgb_fold, params, test_rows) for test_rows in self.test_folds] for params in trials]
+        best = None
+        for params, fold_futures in zip(trials, futures):
+            scores, rounds = zip(*(future.result() for future in fold_futures))
+            result = (params, int(np.mean(rounds)), float(np.mean(scores)))
+            print(f"  xgb trial {params}: cv rmse {result[2]:.3f} at {result[1]} rounds")
+            if best is None or result[2] < best[2]: best = result
+        return best
+
+    def blend_weights(self, names, xgb_params, xgb_rounds):
+        """Non-negative least-squares blend of the members' out-of-fold predictions, normalized to sum to 1."""
+        futures = {name: [self.pool.submit(_member_fold, name, xgb_params, xgb_rounds, self.seed, test_rows) for test_rows in self.test_folds]
+                   for name in names}
+        out_of_fold = np.zeros((len(self.y), len(names)))
+        for column, name in enumerate(names):
+            for test_rows, future in zip(self.test_folds, futures[name]):
+                out_of_fold[test_rows, column] = future.result()
+        cv_rmse = {name: float(np.sqrt(np.mean((out_of_fold[:, i] - self.y) ** 2))) for i, name in enumerate(names)}
+
+        weights, _ = nnls(out_of_fold, self.y)
+        if weights.sum() == 0: weights = np.ones(len(names))
+        weights = weights / weights.sum()
+        blended = out_of_fold @ weights
+        cv_rmse['blend'] = float(np.sqrt(np.mean((blended - self.y) ** 2)))
+        return dict(zip(names, weights.tolist())), cv_rmse
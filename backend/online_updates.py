@@ -0,0 +1,81 @@
+import threading
+import time
+import numpy as np
+from improved_model import BASIC_FEATURES, BASIC_DEFAULTS, ONLINE_XGB_ROUNDS
+
+class OnlineUpdater:
+    """Folds new delay records into the serving model on a background thread.
+
+    Records are buffered until `batch_rows` arrive or `flush_seconds` pass, then one
+    `partial_fit` builds an updated copy of the current predictor while the old one keeps
+    serving. `swap(old, new)` installs the copy; it returns False if the model was replaced
+    meanwhile (e.g. /reload_model), in which case the batch is dropped with the old model.
+    """
+    def __init__(self, get_predictor, swap, batch_rows=256, flush_seconds=60, xgb_rounds=ONLINE_XGB_ROUNDS):
+        self.get_predictor = get_predictor
+        self.swap = swap
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self.xgb_rounds = xgb_rounds
+        self.updates = self.rows_applied = self.rows_dropped = 0
+        self.last_update = None
+        self._pending = []  # (basic feature row in BASIC_FEATURES order, delay minutes)
+        self._condition = threading.Condition()
+        self._update_lock = threading.Lock()  # One partial_fit at a time, whether from the thread or flush().
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def submit(self, features, delay_minutes):
+        """Queue one record: a dict of basic features and the delay that was actually observed."""
+        row = [features.get(name, BASIC_DEFAULTS[name]) for name in BASIC_FEATURES]
+        with self._condition:
+            self._pending.append((row, delay_minutes))
+            if len(self._pending) >= self.batch_rows: self._condition.notify()
+
+    def flush(self):
+        """Apply every pending record now; returns the number of rows folded into the model."""
+        with self._update_lock:
+            with self._condition:
+                batch, self._pending = self._pending, []
+            if not batch: return 0
+            predictor = self.get_predictor()
+            if predictor is None:
+                self.rows_dropped += len(batch)
+                return 0
+            rows, delays = zip(*batch)
+            started = time.perf_counter()
+            updated = predictor.partial_fit(np.array(rows, dtype=float), np.array(delays, dtype=float), xgb_rounds=self.xgb_rounds)
+            if not self.swap(predictor, updated):
+                self.rows_dropped += len(batch)
+                return 0
+            self.updates += 1
+            self.rows_applied += len(batch)
+            self.last_update = {'rows': len(batch), 'seconds': round(time.perf_counter() - started, 3), 'at': time.time()}
+            print(f"✅ Online model update applied ({len(batch)} rows).")
+            return len(batch)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            with self._condition:
+                if len(self._pending) < self.batch_rows: self._condition.wait(self.flush_seconds)
+            if self._stopped.is_set(): break
+            try:
+                self.flush()
+            except Exception as error:
+                print(f"❌ Online model update failed: {error}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='online-updates', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            pending = len(self._pending)
+        return {'pending': pending, 'updates': self.updates, 'rows_applied': self.rows_applied,
+                'rows_dropped': self.rows_dropped, 'last_update': self.last_update}
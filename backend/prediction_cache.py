@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from improved_model import basic_feature_frame
+
+class PredictionCache:
+    """Memoizes EnhancedDelayPredictor results, keyed on the derived feature vector.
+
+    `network_congestion` is quantized to `congestion_step` before predicting, so nearby simulator
+    ticks share an entry. Entries are evicted least-recently-used beyond `max_size` and expire
+    after `ttl_seconds`. Call `reset` whenever the underlying model is reloaded.
+    """
+    def __init__(self, predictor, max_size=1024, ttl_seconds=30, congestion_step=0.05):
+        self.predictor = predictor
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.congestion_step = congestion_step
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()  # key -> (stored_at, result)
+        self._lock = threading.Lock()
+
+    def _quantize(self, congestion):
+        if not self.congestion_step: return congestion
+        return np.round(np.round(np.asarray(congestion, dtype=float) / self.congestion_step) * self.congestion_step, 6)
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None or now - entry[0] > self.ttl_seconds:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def _store(self, key, result, now):
+        self._entries[key] = (now, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def predict_with_explanation(self, input_features):
+        predictor = self.predictor  # One model for the whole call, even if reset() swaps it meanwhile.
+        input_features = dict(input_features, congestion=float(self._quantize(input_features.get('congestion', 0.5))))
+        key = tuple(predictor.create_advanced_features(input_features)[0])
+        now = time.monotonic()
+        with self._lock:
+            result = self._lookup(key, now)
+        if result is None:
+            result = predictor.predict_with_explanation(input_features)
+            with self._lock:
+                if self.predictor is predictor: self._store(key, result, now)
+        return dict(result)
+
+    def predict_batch(self, basic_features):
+        predictor = self.predictor
+        frame = basic_feature_frame(basic_features)
+        if frame.empty: return []
+        if 'congestion' in frame: frame['congestion'] = self._quantize(frame['congestion'].to_numpy())
+        keys = [tuple(row) for row in predictor.create_feature_matrix(frame).tolist()]
+        now = time.monotonic()
+        with self._lock:
+            results = [self._lookup(key, now) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            for i, result in zip(missing, predictor.predict_batch(frame.iloc[missing])):
+                results[i] = result
+            with self._lock:
+                if self.predictor is predictor:
+                    for i in missing: self._store(keys[i], results[i], now)
+        return [dict(result) for result in results]
+
+    def reset(self, predictor=None):
+        """Drop every entry, optionally switching to a newly loaded predictor."""
+        with self._lock:
+            if predictor is not None: self.predictor = predictor
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self._entries),
+                    'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0}
@@ -0,0 +1,84 @@
+import os
+import glob
+import pandas as pd
+from metrics import timed
+
+PAGE_SIZE = 1000  # Supabase caps a single select at 1000 rows by default.
+SNAPSHOT_DIR = os.environ.get("SCHEDULE_CACHE_DIR", ".schedule_cache")
+SCHEDULES_VERSION = os.environ.get("SCHEDULES_VERSION")  # Bump whenever the table changes; the snapshot is only used when set.
+SCHEDULES_PARQUET = os.environ.get("SCHEDULES_PARQUET")  # Load from this file (e.g. data_generator.py --out) instead of Supabase.
+COLUMNS = ['train_id', 'station_name', 'scheduled_time']
+
+class ScheduleLoader:
+    """Fetches the `schedules` table once and keeps the parsed, per-train copy in memory.
+
+    Rows are fetched page by page, timestamps are parsed in one vectorized call, and rows are
+    grouped in a single pass. With a `version` (SCHEDULES_VERSION), the parsed table is also written
+    to a local Parquet snapshot keyed by it, so a restart against an unchanged table skips the
+    database entirely. Without one there is no reliable change marker, so every load queries it.
+    With `parquet_path`, schedules come from that file and the database is never queried.
+    """
+    def __init__(self, client, page_size=PAGE_SIZE, snapshot_dir=SNAPSHOT_DIR, parquet_path=SCHEDULES_PARQUET,
+                 version=SCHEDULES_VERSION):
+        self.client = client
+        self.page_size = page_size
+        self.snapshot_dir = snapshot_dir
+        self.parquet_path = parquet_path
+        self.version = version
+        self._schedules = None
+
+    def load(self):
+        """{train_id: [(station_name, scheduled_time), ...] in time order}, loaded on first use."""
+        if self._schedules is None:
+            self._schedules = self._group(self._load_frame())
+        return self._schedules
+
+    def invalidate(self):
+        """Forget the in-memory copy and delete the on-disk snapshots so the next load queries the database."""
+        self._schedules = None
+        for snapshot_path in glob.glob(os.path.join(self.snapshot_dir, "schedules_v*.parquet")):
+            try: os.remove(snapshot_path)
+            except OSError as e: print(f"Could not delete schedule snapshot {snapshot_path} ({e}).")
+
+    def _load_frame(self):
+        if self.parquet_path:
+            print(f"Loading schedules from {self.parquet_path}...")
+            frame = pd.read_parquet(self.parquet_path, columns=COLUMNS)
+            frame['scheduled_time'] = pd.to_datetime(frame['scheduled_time'], format='ISO8601', utc=True)
+            return frame
+        if not self.version: return self._fetch_frame()
+        snapshot_path = os.path.join(self.snapshot_dir, f"schedules_v{self.version}.parquet")
+        if os.path.exists(snapshot_path):
+            print(f"Loading schedules from local snapshot {snapshot_path}...")
+            return pd.read_parquet(snapshot_path)
+
+        frame = self._fetch_frame()
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            frame.to_parquet(snapshot_path, index=False)
+        except (ImportError, OSError) as e:
+            print(f"Could not write schedule snapshot ({e}); continuing without it.")
+        return frame
+
+    def _fetch_frame(self):
+        print("Loading initial train schedules from Supabase...")
+        rows, start = [], 0
+        while True:
+            with timed('supabase_fetch'):
+                page = (self.client.table('schedules').select(', '.join(COLUMNS))
+                        .order('train_id').order('scheduled_time').order('id')  # Primary key as a unique tiebreaker.
+                        .range(start, start + self.page_size - 1).execute().data)
+            rows.extend(page)
+            if len(page) < self.page_size: break
+            start += self.page_size
+        frame = pd.DataFrame(rows, columns=COLUMNS)
+        frame['scheduled_time'] = pd.to_datetime(frame['scheduled_time'], format='ISO8601', utc=True)
+        return frame
+
+    def _group(self, frame):
+        frame = frame.sort_values(['train_id', 'scheduled_time'], kind='stable')
+        schedules = {}
+        times = frame['scheduled_time'].dt.to_pydatetime()
+        for train_id, station, scheduled_time in zip(frame['train_id'].tolist(), frame['station_name'].tolist(), times):
+            schedules.setdefault(train_id, []).append((station, scheduled_time))
+        return schedules
@@ -0,0 +1,89 @@
+import threading
+import uuid
+from collections import deque
+from metrics import timed
+
+STREAM_BUFFER = 256        # Events kept for streaming clients that fall a little behind.
+KEEPALIVE_SECONDS = 15
+
+def _sse(event, data):
+    return b'event: ' + event.encode() + b'\ndata: ' + data + b'\n\n'
+
+class SimulationClock:
+    """Advances the simulator on a background thread, independent of how often clients poll.
+
+    After every tick (and after any change made under `lock`) the state is serialized once and
+    published as an immutable (etag, body) pair. Readers just take `latest`; a single attribute
+    read needs no lock. Each publish also appends one pre-encoded Server-Sent Event, a 'delta'
+    built from the trains the simulator reports as changed, or a full 'snapshot' on resync.
+    """
+    def __init__(self, get_simulator, serialize, serialize_delta, step_minutes=5, tick_seconds=10):
+        self.get_simulator = get_simulator
+        self.serialize = serialize
+        self.serialize_delta = serialize_delta
+        self.step_minutes = step_minutes
+        self.tick_seconds = tick_seconds
+        self.lock = threading.RLock()  # Held by the tick and by anything else that mutates the simulator.
+        self.latest = None
+        self.events = deque(maxlen=STREAM_BUFFER)  # (sequence, encoded SSE event)
+        self._sequence = 0
+        self._new_event = threading.Condition()
+        self._version = 0
+        self._epoch = uuid.uuid4().hex[:8]  # Keeps ETags from a previous server run from matching.
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def publish(self, resync=False):
+        """Serialize the current state; pass resync=True after changes that are not per-train transitions."""
+        with self.lock:
+            simulator = self.get_simulator()
+            changed = simulator.drain_changes()
+            with timed('serialize_state'):
+                body = self.serialize(simulator)
+            with timed('serialize_delta'):
+                event = _sse('snapshot', body) if resync else _sse('delta', self.serialize_delta(simulator, changed))
+            self._version += 1
+            with self._new_event:
+                self.latest = (f'{self._epoch}-{self._version}', body)
+                self._sequence += 1
+                self.events.append((self._sequence, event))
+                self._new_event.notify_all()
+
+    def tick(self):
+        with self.lock:
+            self.get_simulator().step(minutes=self.step_minutes)
+            self.publish()
+
+    def stream(self):
+        """Yield encoded SSE events for one client: a full snapshot first, then every later event."""
+        with self._new_event:
+            sequence, (_, body) = self._sequence, self.latest
+        yield _sse('snapshot', body)
+        while not self._stopped.is_set():
+            with self._new_event:
+                if self._sequence == sequence: self._new_event.wait(KEEPALIVE_SECONDS)
+                if self._sequence == sequence:
+                    pending = [b': keepalive\n\n']
+                elif self.events[0][0] > sequence + 1:
+                    # Fell behind the buffer: start over from the latest full state.
+                    pending = [_sse('snapshot', self.latest[1])]
+                else:
+                    pending = [event for event_sequence, event in self.events if event_sequence > sequence]
+                sequence = self._sequence
+            yield from pending
+
+    def _run(self):
+        while not self._stopped.wait(self.tick_seconds):
+            self.tick()
+
+    def start(self):
+        """Publish the current state and start ticking; a tick_seconds of 0 leaves the clock manual."""
+        self.publish(resync=True)
+        if self.tick_seconds > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='simulation-clock', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        with self._new_event:
+            self._new_event.notify_all()
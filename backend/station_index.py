@@ -0,0 +1,67 @@
+import copy
+from bisect import bisect_left
+
+class StationIndex:
+    """Inverted index from each station to the stops trains still have to make there.
+
+    Each station keeps its stops in timetable order, so a lookup never rescans whole schedules.
+    Passed stops stay in the lists and are skipped by comparing against each train's position,
+    which is kept current by calling `advance` whenever a train's current_station_index moves
+    and `remove` once it finishes. Finished trains are never indexed.
+    """
+    def __init__(self, trains):
+        self.station_codes = {}
+        self.stops_at = []        # station code -> [(scheduled minutes, train id, stop index)], never trimmed
+        self._unsorted = set()    # station codes whose stops_at gained entries since it was last sorted
+        self.scheduled_minutes = {}  # train id -> scheduled time of each stop, in minutes since the epoch
+        self._position = {}       # train id -> first stop not yet passed (len(schedule) once finished)
+        for train in trains.values(): self.add(train)
+
+    def fork(self):
+        """Independent copy of the mutable index; the per-station stop lists are shared, not copied."""
+        forked = copy.copy(self)
+        forked._position = dict(self._position)
+        return forked
+
+    def _intern(self, station):
+        code = self.station_codes.get(station)
+        if code is None:
+            code = self.station_codes[station] = len(self.stops_at)
+            self.stops_at.append([])
+        return code
+
+    def add(self, train):
+        minutes = self.scheduled_minutes[train.id] = [scheduled.timestamp() / 60 for _, scheduled in train.schedule]
+        for col, (station, _) in enumerate(train.schedule):
+            code = self._intern(station)
+            self.stops_at[code].append((minutes[col], train.id, col))
+            self._unsorted.add(code)
+        self._position[train.id] = len(train.schedule) if train.status == 'FINISHED' else train.current_station_index
+
+    def advance(self, train):
+        """Skip the stops a train has moved past since the last sync."""
+        self._position[train.id] = max(self._position[train.id], train.current_station_index)
+
+    def remove(self, train):
+        """Drop a finished train from every station it was still due at."""
+        self._position[train.id] = len(train.schedule)
+
+    def _stops(self, station):
+        code = self.station_codes.get(station)
+        if code is None: return []
+        if code in self._unsorted:
+            self.stops_at[code].sort()
+            self._unsorted.discard(code)
+        return self.stops_at[code]
+
+    def stops_after(self, station, minutes):
+        """Yield (scheduled minutes, train id, stop index) for the stops at `station` not yet passed and
+        scheduled at or after `minutes`, in timetable order."""
+        stops, position = self._stops(station), self._position
+        for i in range(bisect_left(stops, (minutes,)), len(stops)):
+            if stops[i][2] >= position[stops[i][1]]: yield stops[i]
+
+    def trains_due(self, station):
+        """Ids of the trains that will still pass through `station`."""
+        position = self._position
+        return {train_id for _, train_id, col in self._stops(station) if col >= position[train_id]}
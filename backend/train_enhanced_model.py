@@ -1,48 +1,89 @@
 import os
+import sys
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import joblib
 from supabase import create_client, Client
 from dotenv import load_dotenv
 from improved_model import EnhancedDelayPredictor
+from compiled_model import export_compiled_model, ARRAYS_PATH, BOOSTER_PATH
 
-def run_training():
+PAGE_SIZE = int(os.environ.get("TRAINING_PAGE_SIZE", 1000))       # Rows per Supabase request.
+CHUNK_ROWS = int(os.environ.get("TRAINING_CHUNK_ROWS", 100_000))  # Rows per chunk handed to the trainer.
+TRAINING_SEED = int(os.environ.get("TRAINING_SEED", 42))
+DELAYS_PARQUET = os.environ.get("DELAYS_PARQUET")  # Train from this file (e.g. data_generator.py --out) instead of Supabase.
+WEATHER_SEVERITY = {'Foggy': 8, 'Rainy': 4}  # Anything else counts as clear (1).
+
+def fetch_delay_pages(supabase, page_size=PAGE_SIZE):
+    """Yield the `delays` table one page (DataFrame) at a time."""
+    start = 0
+    while True:
+        page = (supabase.table('delays').select('train_id, delay_minutes, recorded_at, weather_condition')
+                .order('recorded_at').order('id')  # recorded_at repeats; the primary key keeps pages disjoint.
+                .range(start, start + page_size - 1).execute().data)
+        if page: yield pd.DataFrame(page)
+        if len(page) < page_size: break
+        start += page_size
+
+def read_delay_parquet(path, rows=CHUNK_ROWS):
+    """Yield a local delays Parquet file in chunks of `rows` rows."""
+    import pyarrow.parquet as pq
+    columns = ['train_id', 'delay_minutes', 'recorded_at', 'weather_condition']
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=rows, columns=columns):
+        yield batch.to_pandas()
+
+def rebatch(pages, rows=CHUNK_ROWS):
+    """Concatenate small pages into chunks of roughly `rows` rows."""
+    pending, pending_rows = [], 0
+    for page in pages:
+        pending.append(page)
+        pending_rows += len(page)
+        if pending_rows >= rows:
+            yield pd.concat(pending, ignore_index=True)
+            pending, pending_rows = [], 0
+    if pending: yield pd.concat(pending, ignore_index=True)
+
+def build_training_chunk(df, rng):
+    """Vectorized feature derivation for one chunk of delay records: (basic feature frame, delays)."""
+    recorded_at = pd.to_datetime(df['recorded_at'], format='ISO8601')
+    delays = df['delay_minutes'].to_numpy()
+    basic_features = pd.DataFrame({
+        'hour': recorded_at.dt.hour.to_numpy(),
+        'day_of_week': recorded_at.dt.weekday.to_numpy(),
+        'priority': np.where(df['train_id'].str.contains('Express', regex=False), 1, 2), # Example priority
+        'initial_delay': np.maximum(0, delays - rng.integers(5, 15, len(df))),
+        'weather_severity': df['weather_condition'].map(WEATHER_SEVERITY).fillna(1).to_numpy(),
+        'congestion': rng.uniform(0.2, 0.8, len(df)) # Simulate congestion
+    })
+    return basic_features, delays
+
+def run_training(tune=False):
     load_dotenv()
-    url: str = os.environ.get("SUPABASE_URL")
-    key: str = os.environ.get("SUPABASE_KEY")
-    supabase: Client = create_client(url, key)
-
-    print("Fetching delay data from Supabase for enhanced training...")
-    response = supabase.table('delays').select('*').execute()
-    df = pd.DataFrame(response.data)
-    df['recorded_at'] = pd.to_datetime(df['recorded_at'])
-    print(f"Fetched {len(df)} records.")
-
-    # Transform DataFrame into the required training format
-    training_data = []
-    for _, row in df.iterrows():
-        # Create a simplified feature set from the raw data for training
-        features = {
-            'hour': row['recorded_at'].hour,
-            'day_of_week': row['recorded_at'].weekday(),
-            'priority': 1 if 'Express' in row['train_id'] else 2, # Example priority
-            'initial_delay': max(0, row['delay_minutes'] - np.random.randint(5,15)),
-            'weather_severity': 8 if row['weather_condition'] == 'Foggy' else 4 if row['weather_condition'] == 'Rainy' else 1,
-            'congestion': np.random.uniform(0.2, 0.8) # Simulate congestion
-        }
-        training_data.append({
-            'features': features,
-            'delay_minutes': row['delay_minutes']
-        })
+    if DELAYS_PARQUET:
+        print(f"Streaming delay data from {DELAYS_PARQUET} for enhanced training...")
+        frames = read_delay_parquet(DELAYS_PARQUET)
+    else:
+        url: str = os.environ.get("SUPABASE_URL")
+        key: str = os.environ.get("SUPABASE_KEY")
+        supabase: Client = create_client(url, key)
+        print("Streaming delay data from Supabase for enhanced training...")
+        frames = rebatch(fetch_delay_pages(supabase))
+    rng = np.random.default_rng(TRAINING_SEED)
+    chunks = (build_training_chunk(df, rng) for df in frames)
 
     # Instantiate and train the model
     predictor = EnhancedDelayPredictor()
-    predictor.train(training_data)
+    predictor.train_streaming(chunks, seed=TRAINING_SEED, tune=tune)
+    print(f"Stage timings (s): {predictor.training_report['stage_seconds']}")
 
     # Save the entire trained model object
     joblib.dump(predictor, 'enhanced_delay_model.pkl')
     print("\n✅ Enhanced model has been trained and saved as 'enhanced_delay_model.pkl'")
 
+    # Export the fast inference artifact that app.py prefers at startup
+    export_compiled_model(predictor)
+    print(f"✅ Compiled inference artifact written to '{ARRAYS_PATH}' and '{BOOSTER_PATH}'")
+
 if __name__ == '__main__':
-    import numpy as np
-    run_training()
\ No newline at end of file
+    run_training(tune='--tune' in sys.argv)
@@ -0,0 +1,82 @@
+import os
+import pickle
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+import numpy as np
+from fleet_engine import FleetEngine, ON_TIME, FINISHED
+from station_index import StationIndex
+from cascade import CascadePropagator, DEFAULT_SEED
+
+WHAT_IF_WORKERS = int(os.environ.get("WHAT_IF_WORKERS", os.cpu_count() or 2))
+
+def _start_executor():
+    """Start the worker pool at import, while the importing process still has a single thread.
+
+    Forking once the clock, online-update, profiler and request threads run could leave locks they
+    hold locked forever in the workers. 'fork' is preferred because 'spawn' re-executes `python app.py`
+    in every worker (Supabase client, model loading).
+    """
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+    executor = ProcessPoolExecutor(max_workers=WHAT_IF_WORKERS, mp_context=multiprocessing.get_context(method))
+    executor.submit(int).result()  # With 'fork' this starts every worker now rather than on the first request.
+    return executor
+
+def pack_state(snapshot):
+    """Pickle the parts of a TrainSimulator snapshot a worker needs, once for all candidates."""
+    return pickle.dumps((snapshot['trains'], snapshot['current_time']), protocol=pickle.HIGHEST_PROTOCOL)
+
+def run_candidate(packed_state, candidate, hours, step_minutes, seed):
+    """Apply one candidate's delay actions (with their knock-on cascade) and run the fleet forward."""
+    train_states, current_time = pickle.loads(packed_state)
+    trains = {
+        train_id: SimpleNamespace(id=train_id, schedule=schedule, current_station_index=index, current_delay=delay, status=status)
+        for train_id, (schedule, index, delay, status) in train_states.items()
+    }
+    station_index = StationIndex(trains)
+    knock_on_minutes = 0
+    for action in candidate.get('actions', []):
+        train = trains.get(action['train_id'])
+        if train is None: continue
+        # Propagate against the pre-action state: the propagator adds the new delay to current_delay itself.
+        knock_ons = {}
+        if action['delay_minutes'] > 0:
+            knock_ons = CascadePropagator(trains, station_index, current_time, seed=seed).propagate(train.id, action['delay_minutes'])
+        train.current_delay += action['delay_minutes']
+        train.status = 'DELAYED'
+        for other_id, knock_on in knock_ons.items():
+            extra = int(round(knock_on['additional_delay']))
+            if extra <= 0: continue
+            trains[other_id].current_delay += extra
+            trains[other_id].status = 'DELAYED'
+            knock_on_minutes += extra
+
+    fleet = FleetEngine(trains, current_time)
+    for _ in range(int(hours * 60 // step_minutes)): fleet.step(step_minutes)
+
+    active = fleet.status != FINISHED
+    active_delays = fleet.delay[active]
+    return {
+        'name': candidate.get('name'),
+        'on_time_percentage': round(float((fleet.status[active] == ON_TIME).mean() * 100), 1) if active.any() else 100.0,
+        'average_delay_minutes': round(float(active_delays.mean()), 1) if active.any() else 0.0,
+        'p95_delay_minutes': float(np.percentile(active_delays, 95)) if active.any() else 0.0,
+        'active_trains': int(active.sum()),
+        'finished_trains': int((~active).sum()),
+        'knock_on_minutes': knock_on_minutes,
+        'total_delay_minutes': int(fleet.delay.sum())
+    }
+
+def compare_candidates(snapshot, candidates, hours=2, step_minutes=5, seed=DEFAULT_SEED):
+    """Simulate every candidate (plus a no-action baseline) in parallel from the same snapshot.
+
+    Results are ordered best first by total delay minutes across the fleet.
+    """
+    packed_state = pack_state(snapshot)
+    candidates = [{'name': 'baseline', 'actions': []}] + list(candidates)
+    futures = [_executor.submit(run_candidate, packed_state, c, hours, step_minutes, seed) for c in candidates]
+    results = [future.result() for future in futures]
+    return sorted(results, key=lambda result: result['total_delay_minutes'])
+
+# Last, so the forked workers see the whole module.
+_executor = _start_executor()